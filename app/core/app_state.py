@@ -25,24 +25,39 @@ class AppState:
         # 数据加载状态
         self.data_loaded: bool = False
         self.data_loading: bool = False
+        # is_data_loaded 是否已探测过数据库（只探测一次，卸载/重新加载时清除）
+        self._existence_checked: bool = False
         
         # 当前Excel文件路径
         self.current_excel_file: Optional[str] = None
         
+        # 单词总数（加载完成时统计一次，卸载/重新加载时清除）
+        self.word_count: Optional[int] = None
+        
+        # 今日一签图片文件名（启动预处理后确定；换图需重启，与 WEBP 转换时机一致）
+        self.todayphrase_name: Optional[str] = None
+        # 预处理未得到文件名时使用的扫描结果缓存（以 TodayPhrase 目录修改时间为键）
+        self.todayphrase_cache: dict = {"dir_mtime_ns": None, "name": None}
+        
         # 应用启动时间
         self.start_time: Optional[float] = None
         
         # 数据库连接池（会在main.py中设置）
-        self.db_pool = None  # 单词数据库连接池
+        self.db_pool = None  # 单词数据库连接池（只读）
         self.activity_db_pool = None  # 用户行为数据库连接池（独立）
         
+        # 共用的HTTP客户端（AI接口调用，会在main.py中创建）
+        self.http_client = None
+        
         self._initialized = True
     
     def reset(self):
         """重置状态（用于测试或重载）"""
         self.data_loaded = False
         self.data_loading = False
+        self._existence_checked = False
         self.current_excel_file = None
+        self.word_count = None
 
 
 # 全局应用状态实例
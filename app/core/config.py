@@ -11,12 +11,13 @@ SQLITE_DB_PATH = os.path.join(SQLITE_DIR, "paraphrase.sqlite")  # 单词数据
 USER_ACTIVITY_DB_PATH = os.path.join(SQLITE_DIR, "user_activity.sqlite")  # 用户行为数据库（独立）
 APIKEY_PATH = os.path.join(BASE_DIR, "apikey.json")
 
-TXT_EXTENSIONS = {".txt"}
-EXCEL_EXTENSIONS = {".xlsx", ".xls"}
-IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif"}
+TXT_EXTENSIONS = frozenset({".txt"})
+EXCEL_EXTENSIONS = frozenset({".xlsx", ".xls"})
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".webp", ".gif"})
 
 # 确保必要目录存在
 os.makedirs(SQLITE_DIR, exist_ok=True)
 os.makedirs(STATIC_DIR, exist_ok=True)
+os.makedirs(TODAY_PHRASE_DIR, exist_ok=True)
 os.makedirs(TEMPLATES_DIR, exist_ok=True)
 
@@ -1,12 +1,23 @@
+import asyncio
 import os
+import pathlib
 import sqlite3
 import threading
-from typing import Optional, List, Tuple, Dict, Any
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Optional, List, Tuple, Dict, Any, Sequence
+from datetime import date, datetime
 from openpyxl import load_workbook
 
+try:
+    # Rust 实现的 Excel 解析器，比 openpyxl 逐单元格解析快数倍
+    from python_calamine import CalamineWorkbook
+except ImportError:  # 未安装时回退到 openpyxl
+    CalamineWorkbook = None
+
 from .config import SQLITE_DB_PATH, SQLITE_DIR
-from .utils import normalize_word
+from .utils import normalize_words
 from .loading import loading_state
 from .logger import get_logger
 
@@ -18,17 +29,117 @@ loading_cancelled = False
 
 # 备注：状态统一放在 core/app_state.py 中
 
+BULK_PAGE_SIZE = 32768  # 重建后的数据库页大小
+# 重建时先写入这个临时文件，完成后整体替换 SQLITE_DB_PATH；写入期间不与连接池争用数据库文件
+BUILD_DB_PATH = SQLITE_DB_PATH + ".building"
+VACUUM_FREELIST_RATIO = 0.2  # 空闲页超过 20% 才压缩数据库文件
+
+
+def _open_workbook(file_path: str):
+    """打开 Excel 工作簿，返回 (工作簿对象, 工作表名列表)"""
+    if CalamineWorkbook is not None:
+        wb = CalamineWorkbook.from_path(file_path)
+        return wb, list(wb.sheet_names)
+    wb = load_workbook(filename=file_path, read_only=True, data_only=True)
+    return wb, [ws.title for ws in wb.worksheets]
+
+
+def _calamine_cell(value: Any) -> Any:
+    """把 calamine 的单元格值转成 openpyxl 的表示：空单元格为 None，整数为 int，纯日期为 datetime"""
+    cls = type(value)
+    if cls is str:
+        return value or None
+    if cls is float:
+        return int(value) if value.is_integer() else value
+    if cls is date:
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+def _sheet_rows(wb, sheet: str) -> Tuple[int, List[Sequence[Any]]]:
+    """读取整张工作表，返回 (列数, 行列表)；行下标与列下标均从 A1 开始"""
+    if CalamineWorkbook is not None:
+        # skip_empty_area=False：不跳过左上角空白区域，保持与 openpyxl 相同的行列下标
+        raw_rows = wb.get_sheet_by_name(sheet).to_python(skip_empty_area=False)
+        # calamine 把空单元格读成 ""、数字一律读成 float，逐格转换后入库结果与 openpyxl 一致
+        rows = [[_calamine_cell(value) for value in row] for row in raw_rows]
+        return (len(rows[0]) if rows else 0), rows
+    ws = wb[sheet]
+    return (ws.max_column or 0), list(ws.iter_rows(values_only=True))
+
+
+def _cell_text(value: Any) -> Optional[str]:
+    """音标/释义单元格转为入库文本；空单元格和空字符串都存 NULL（两种读取方式对空串的区分不一致）"""
+    if value is None or value == "":
+        return None
+    return value if type(value) is str else str(value)
+
+
+def _clean_word(word_raw: Any) -> str:
+    """单词单元格转为去掉首尾空白的字符串"""
+    if isinstance(word_raw, str):
+        return word_raw.strip()
+    return "" if word_raw is None else str(word_raw).strip()
+
+
+def _parse_sheet(wb, sheet: str) -> List[Tuple[str, Optional[str], Optional[str], Optional[str], str, int]]:
+    """把一个工作表解析为待插入 entries 表的元组列表"""
+    max_cols, rows = _sheet_rows(wb, sheet)
+    max_cols = max_cols or 1
+
+    if max_cols >= 4 and min(map(len, rows), default=4) >= 4:
+        # 常见情况：每行都有 序号/单词/音标/释义 四列，直接按下标取值，不再逐行判断长度
+        display_words = [_clean_word(row[1]) for row in rows]
+        # 整列一次性标准化，代替逐行调用 normalize_word
+        norms = normalize_words(display_words)
+        return [
+            (
+                norm,
+                display_word or None,
+                _cell_text(row[2]),
+                _cell_text(row[3]),
+                sheet,
+                row_idx,
+            )
+            for row_idx, (row, display_word, norm) in enumerate(zip(rows, display_words, norms))
+        ]
 
-def compute_total_rows(file_path: str) -> int:
-    """计算 Excel 文件总行数"""
+    # 列数不足四列（或行长度不一）的工作表：逐行检查边界
+    word_col_idx = 1 if max_cols > 1 else 0
+    display_words = [
+        _clean_word(row[word_col_idx] if word_col_idx < len(row or ()) else None) for row in rows
+    ]
+    norms = normalize_words(display_words)
+
+    entries = []
+    for row_idx, (row, display_word, norm) in enumerate(zip(rows, display_words, norms)):
+        phonetic_val = row[2] if (row and len(row) > 2) else None
+        meaning_val = row[3] if (row and len(row) > 3) else None
+        entries.append((norm, display_word or None, _cell_text(phonetic_val), _cell_text(meaning_val), sheet, row_idx))
+    return entries
+
+
+def _declared_total_rows(wb) -> Optional[int]:
+    """
+    从已打开的工作簿元数据读取总行数，不解析单元格
+    
+    返回：
+        总行数；calamine 需要解析整张表才知道行数，此时返回 None
+    """
+    if CalamineWorkbook is not None:
+        return None
     try:
-        wb = load_workbook(filename=file_path, read_only=True, data_only=True)
-        total = 0
-        for ws in wb.worksheets:
-            total += (ws.max_row or 0)
-        return total
+        return sum((ws.max_row or 0) for ws in wb.worksheets)
     except Exception:
-        return 0
+        return None
+
+
+def _remove_build_file() -> None:
+    """删除重建用的临时数据库文件（不存在时忽略）"""
+    try:
+        os.remove(BUILD_DB_PATH)
+    except FileNotFoundError:
+        pass
 
 
 def _rebuild_sqlite_from_excel(file_path: str) -> None:
@@ -36,19 +147,27 @@ def _rebuild_sqlite_from_excel(file_path: str) -> None:
     global loading_cancelled
     from .app_state import app_state
     
-    wb = load_workbook(filename=file_path, read_only=True, data_only=True)
-    sheets = [ws.title for ws in wb.worksheets]
+    wb, sheets = _open_workbook(file_path)
+
+    # 总行数从同一个工作簿句柄得到，不再为统计行数单独解析一遍 Excel
+    declared_total = _declared_total_rows(wb)
+    if declared_total is not None:
+        loading_state.set_total_words(declared_total)
 
     os.makedirs(SQLITE_DIR, exist_ok=True)
+    _remove_build_file()  # 上次异常退出残留的半成品
 
-    con = sqlite3.connect(SQLITE_DB_PATH)
+    con = sqlite3.connect(BUILD_DB_PATH)
     cur = con.cursor()
     try:
-        cur.execute("PRAGMA journal_mode=WAL;")
-        cur.execute("PRAGMA synchronous=NORMAL;")
+        # 批量导入专用设置：临时文件只有本连接使用，失败或取消时整个丢弃，不需要日志、fsync 和锁协商
+        cur.execute("PRAGMA journal_mode=OFF;")
+        cur.execute("PRAGMA locking_mode=EXCLUSIVE;")
+        cur.execute("PRAGMA synchronous=OFF;")
+        cur.execute("PRAGMA cache_size=-65536;")  # 64MB
         cur.execute("PRAGMA temp_store=MEMORY;")
+        cur.execute(f"PRAGMA page_size={BULK_PAGE_SIZE};")  # 空库建表前设置，立即生效
 
-        cur.execute("DROP TABLE IF EXISTS entries;")
         cur.execute(
             """
             CREATE TABLE entries (
@@ -67,75 +186,127 @@ def _rebuild_sqlite_from_excel(file_path: str) -> None:
 
         SAMPLE_STEP = 10
         LATEST_LIMIT = 40
+        PROGRESS_STEP = 1000  # 每处理 1000 行汇报一次进度，避免逐行加锁
         loading_state.clear_error()
 
+        # executemany 直接消费元组：语句只编译一次，每行只是绑定参数后 step，已是 Python sqlite3 下最快的写入方式
+        # （标准库未附带 csv 虚拟表扩展；改走 json_each 做 INSERT ... SELECT 实测反而慢 2~3 倍）
         insert_sql = (
             "INSERT INTO entries (word_norm, word, phonetic, meaning, sheet, row_index) VALUES (?, ?, ?, ?, ?, ?)"
         )
 
-        for sheet in sheets:
-            if loading_cancelled:
-                con.rollback()
-                raise RuntimeError("loading cancelled")
-                
-            loading_state.set_current_sheet(sheet)
-            ws = wb[sheet]
-            max_cols = ws.max_column or 1
-            word_col_idx = 1 if max_cols > 1 else 0
-            
-            batch: List[Tuple[str, Optional[str], Optional[str], Optional[str], str, int]] = []
-            for row_idx, row in enumerate(ws.iter_rows(values_only=True)):
-                if loading_cancelled:
-                    con.rollback()
-                    raise RuntimeError("loading cancelled")
-                    
-                word_raw = row[word_col_idx] if word_col_idx < len(row or ()) else None
-                display_word = "" if word_raw is None else str(word_raw).strip()
-                norm = normalize_word(display_word)
-                
-                phonetic_val = row[2] if (row and len(row) > 2) else None
-                meaning_val = row[3] if (row and len(row) > 3) else None
-                phonetic = None if phonetic_val is None else str(phonetic_val)
-                meaning = None if meaning_val is None else str(meaning_val)
-
-                batch.append((norm, display_word or None, phonetic, meaning, sheet, int(row_idx)))
-
-                processed_now = loading_state.increment_processed(
-                    increment=1,
-                    sample_word=display_word,
+        def _progress_iter(entries: List[Tuple[str, Optional[str], Optional[str], Optional[str], str, int]]):
+            """逐行交给 executemany 消费，同时按批汇报进度并检查是否取消"""
+            pending = 0
+            for entry in entries:
+                yield entry
+
+                pending += 1
+                if pending >= PROGRESS_STEP:
+                    # 只在批次边界检查取消标记，1000 行的延迟远小于 1 秒
+                    if loading_cancelled:
+                        raise RuntimeError("loading cancelled")
+                    loading_state.increment_processed(
+                        increment=pending,
+                        sample_word=entry[1],
+                        sample_step=SAMPLE_STEP,
+                        latest_limit=LATEST_LIMIT,
+                    )
+                    pending = 0
+
+            if pending:
+                loading_state.increment_processed(
+                    increment=pending,
+                    sample_word=entries[-1][1],
                     sample_step=SAMPLE_STEP,
                     latest_limit=LATEST_LIMIT,
                 )
 
-                if len(batch) >= 10000:
-                    cur.executemany(insert_sql, batch)
-                    batch.clear()
+        # 多线程解析工作表，当前线程作为唯一的写入者；每个解析线程各自打开工作簿
+        parser_local = threading.local()
+        spare_wbs = [wb]  # 已打开的工作簿交给第一个解析线程复用
+
+        def _parse_in_worker(sheet: str):
+            worker_wb = getattr(parser_local, "wb", None)
+            if worker_wb is None:
+                try:
+                    worker_wb = spare_wbs.pop()
+                except IndexError:
+                    worker_wb, _ = _open_workbook(file_path)
+                parser_local.wb = worker_wb
+            entries = _parse_sheet(worker_wb, sheet)
+            if declared_total is None:
+                # 元数据里没有行数：每解析完一张表累加一次，百分比随之更新
+                loading_state.add_total_words(len(entries))
+            return entries
 
-            if batch:
-                cur.executemany(insert_sql, batch)
-                batch.clear()
+        workers = max(1, min(len(sheets), os.cpu_count() or 1))
+        sheet_iter = iter(sheets)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="excel-parse") as executor:
+            # 按工作表顺序提交且最多 workers 个在途：写入顺序（即 id 顺序）不变，内存占用有上限
+            in_flight = deque(
+                (sheet, executor.submit(_parse_in_worker, sheet)) for sheet in islice(sheet_iter, workers)
+            )
+            try:
+                while in_flight:
+                    sheet, future = in_flight.popleft()
+                    next_sheet = next(sheet_iter, None)
+                    if next_sheet is not None:
+                        in_flight.append((next_sheet, executor.submit(_parse_in_worker, next_sheet)))
 
-        cur.execute("CREATE INDEX idx_entries_word_norm ON entries(word_norm);")
-        cur.execute("CREATE INDEX idx_entries_sheet_row ON entries(sheet, row_index);")
+                    if loading_cancelled:
+                        # journal_mode=OFF 下不能回滚，临时文件在 finally 中整个删除
+                        raise RuntimeError("loading cancelled")
+
+                    loading_state.set_current_sheet(sheet)
+                    cur.executemany(insert_sql, _progress_iter(future.result()))
+            finally:
+                for _, pending_future in in_flight:
+                    pending_future.cancel()
 
         con.commit()
-        
-        # 加载完成后，关闭WAL模式并合并临时文件
-        logger.info("正在合并WAL文件到主数据库...")
-        cur.execute("PRAGMA wal_checkpoint(TRUNCATE);")  # 强制合并WAL到主文件
-        cur.execute("PRAGMA journal_mode=DELETE;")      # 切换回标准模式
+
+        # 全部数据写入后再建索引；加大页缓存让 B 树构建尽量在内存中完成
+        cur.execute("PRAGMA cache_size=-262144;")  # 256MB
+        con.execute("BEGIN IMMEDIATE;")
+        cur.execute("CREATE INDEX idx_entries_word_norm ON entries(word_norm);")  # /api/lookup、/api/excel/search
+        cur.execute("CREATE INDEX idx_entries_sheet_row ON entries(sheet, row_index);")  # /api/excel/row
+        # /api/wordbook/range 按 id 范围查询：id 即 rowid，表 B 树本身按 id 有序，不需要额外的覆盖索引
         con.commit()
+        cur.execute("ANALYZE entries;")  # 生成统计信息，查询规划器立即使用新索引
         
-        # 优化数据库文件（可选，会花一点时间）
-        logger.info("正在优化数据库文件...")
-        cur.execute("VACUUM;")
-        logger.info("数据库优化完成，WAL模式已关闭")
+        # 只在空闲页较多时才 VACUUM，它会重写整个文件（新建的临时库里 page_size 已经生效，不需要靠 VACUUM 应用）
+        (page_count,) = cur.execute("PRAGMA page_count;").fetchone()
+        (freelist_count,) = cur.execute("PRAGMA freelist_count;").fetchone()
+        if page_count and freelist_count / page_count > VACUUM_FREELIST_RATIO:
+            logger.info(f"正在压缩数据库文件（空闲页 {freelist_count}/{page_count}）...")
+            cur.execute("VACUUM;")
+        
+        cur.execute("PRAGMA optimize;")
+        logger.info("数据库优化完成")
 
-        app_state.data_loaded = True
-        app_state.current_excel_file = file_path
-        logger.info(f"Excel数据加载完成: {os.path.basename(file_path)}")
-    finally:
+        # 表每次重建、只追加不删除，id 从1连续编号：MAX(id) 即单词总数，只需读 B 树最右端，不用全表计数
+        (max_id,) = cur.execute("SELECT MAX(id) FROM entries;").fetchone()
+    except BaseException:
         con.close()
+        _remove_build_file()  # 失败或取消：丢弃半成品，正在使用的数据库文件不受影响
+        raise
+    con.close()
+
+    try:
+        # 新库之后只被只读连接池读取，保持默认的回滚日志模式即可（journal_mode=OFF 不会写入文件）
+        if app_state.db_pool:
+            # 连接池收回并关闭旧连接后替换文件，再按新文件重新建连
+            app_state.db_pool.replace_file(BUILD_DB_PATH)
+        else:
+            os.replace(BUILD_DB_PATH, SQLITE_DB_PATH)
+    finally:
+        _remove_build_file()
+
+    app_state.word_count = max_id or 0
+    app_state.data_loaded = True
+    app_state.current_excel_file = file_path
+    logger.info(f"Excel数据加载完成: {os.path.basename(file_path)}")
 
 
 def loader_worker(file_path: str):
@@ -145,10 +316,10 @@ def loader_worker(file_path: str):
     
     try:
         file_name = os.path.basename(file_path)
-        total_rows = compute_total_rows(file_path)
-        loading_state.reset_for_file(file_name, total_rows)
+        # 总行数在重建过程中由同一个工作簿句柄填入
+        loading_state.reset_for_file(file_name)
         loading_cancelled = False
-        logger.info(f"开始加载Excel: {file_name}, 总行数: {total_rows}")
+        logger.info(f"开始加载Excel: {file_name}")
         _rebuild_sqlite_from_excel(file_path)
     except Exception as exc:
         logger.error(f"Excel加载失败: {exc}", exc_info=True)
@@ -159,36 +330,57 @@ def loader_worker(file_path: str):
         loading_thread = None
 
 
-def is_data_loaded() -> bool:
-    """检查数据是否已加载"""
+_SQL_ENTRIES_TABLE = "SELECT 1 FROM sqlite_master WHERE type='table' AND name='entries'"
+
+
+def _entries_table_exists(conn: sqlite3.Connection) -> bool:
+    """entries 表是否存在"""
+    return conn.execute(_SQL_ENTRIES_TABLE).fetchone() is not None
+
+
+def _probe_db_file() -> bool:
+    """连接池尚未建连时，直接以只读方式打开数据库文件检查 entries 表"""
+    if not os.path.exists(SQLITE_DB_PATH):
+        return False
+    con = sqlite3.connect(f"{pathlib.Path(SQLITE_DB_PATH).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        return _entries_table_exists(con)
+    finally:
+        con.close()
+
+
+async def is_data_loaded() -> bool:
+    """检查数据是否已加载（首次探测数据库在线程中执行，不阻塞事件循环）"""
     from .app_state import app_state
     
-    if not app_state.data_loaded:
-        # 尝试检测数据库是否存在
-        try:
-            if os.path.exists(SQLITE_DB_PATH):
-                # 使用连接池检查（如果已初始化）
-                if app_state.db_pool:
-                    try:
-                        with app_state.db_pool.get_db() as conn:
-                            cur = conn.cursor()
-                            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='entries'")
-                            exists = cur.fetchone() is not None
-                            if exists:
-                                app_state.data_loaded = True
-                    except Exception:
-                        app_state.data_loaded = False
-                else:
-                    # 连接池未初始化，直接连接检查
-                    con = sqlite3.connect(SQLITE_DB_PATH)
-                    cur = con.cursor()
-                    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='entries'")
-                    exists = cur.fetchone() is not None
-                    con.close()
-                    if exists:
-                        app_state.data_loaded = True
-        except Exception:
-            app_state.data_loaded = False
+    if app_state.data_loaded or app_state._existence_checked:
+        return app_state.data_loaded
+    if loading_state.snapshot().get("running"):
+        # 加载中：新库还没替换进来，不探测也不缓存
+        return False
+    
+    pool = app_state.db_pool
+    if pool is not None and not pool.initialized:
+        # 连接池还没建连（或建连失败）：查询必然失败，按未加载处理，不缓存
+        return False
+    try:
+        if not os.path.exists(SQLITE_DB_PATH):
+            exists = False
+        elif pool is not None:
+            exists = await pool.run(_entries_table_exists)
+        else:
+            exists = await asyncio.to_thread(_probe_db_file)
+    except Exception as exc:
+        # 数据库忙（busy_timeout 超时）或暂时无法读取：本次按未加载处理，不缓存，下次请求重新探测
+        logger.warning(f"检查数据库状态失败: {exc}")
+        return False
+    if loading_state.snapshot().get("running"):
+        return False
+    
+    # 探测结果缓存，之后不再重复查询 sqlite_master
+    app_state._existence_checked = True
+    if exists:
+        app_state.data_loaded = True
     return app_state.data_loaded
 
 
@@ -202,9 +394,11 @@ def start_loading(file_path: str) -> bool:
         return False
     
     app_state.data_loaded = False
+    app_state._existence_checked = False
     app_state.current_excel_file = None
+    app_state.word_count = None
     
-    # 不删除数据库文件，直接用 DROP TABLE 覆盖表内容（避免文件占用问题）
+    # 不删除数据库文件：新库在临时文件中重建，完成后才整体替换
     logger.info("准备加载新数据")
         
     t = threading.Thread(target=loader_worker, args=(file_path,), daemon=True)
@@ -219,7 +413,13 @@ def unload_data():
     from .app_state import app_state
     
     app_state.data_loaded = False
+    app_state._existence_checked = False
     app_state.current_excel_file = None
+    app_state.word_count = None
+    
+    # 先关闭连接池：否则连接仍持有已删除的文件，照样能查到旧数据（Windows 上还会删除失败）
+    if app_state.db_pool:
+        app_state.db_pool.close_all()
     
     try:
         if os.path.exists(SQLITE_DB_PATH):
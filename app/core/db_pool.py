@@ -2,28 +2,73 @@
 数据库连接池管理
 用于复用数据库连接，提升性能
 """
+import asyncio
+import os
+import pathlib
 import sqlite3
+import time
 from contextlib import contextmanager
-from typing import Optional
+from typing import Any, Callable, Optional, Sequence, Tuple, TypeVar
 from queue import Queue, Empty
 import threading
 
+T = TypeVar("T")
+
+# 每个连接创建后执行的 PRAGMA：64MB 页缓存、mmap 读取、遇锁等待5秒
+CONNECTION_PRAGMAS = (
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=2147483648",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+# 只在读写连接上执行（只读连接无法修改日志模式）：WAL 让读写并发
+WRITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+)
+# 只在只读连接上执行：即使误执行写语句也会直接报错
+READ_ONLY_PRAGMAS = (
+    "PRAGMA query_only=1",
+)
+
+# 每个连接缓存的预编译语句数（sqlite3 默认128）：相同 SQL 字符串再次执行时跳过解析和编译
+STATEMENT_CACHE_SIZE = 256
+
+# 只读连接池大小上限：SQLite 读连接再多也只是争抢 CPU 和页缓存
+READ_POOL_MAX_SIZE = 16
+
+
+def default_read_pool_size() -> int:
+    """只读连接池大小：CPU核数*2+1，不超过 READ_POOL_MAX_SIZE"""
+    return min((os.cpu_count() or 1) * 2 + 1, READ_POOL_MAX_SIZE)
+
 
 class DatabasePool:
     """SQLite数据库连接池（线程安全）"""
     
-    def __init__(self, db_path: str, pool_size: int = 5):
+    def __init__(self, db_path: str, pool_size: int = 5, read_only: bool = False,
+                 warm_statements: Sequence[Tuple[str, tuple]] = ()):
         """
         初始化连接池
         
         参数：
         - db_path: 数据库文件路径
         - pool_size: 连接池大小（默认5个连接）
+        - read_only: 是否以只读模式（mode=ro）打开连接，只读连接不参与写锁竞争
+        - warm_statements: 建连后在每个连接上各执行一次的 (SQL, 参数)，预先编译进语句缓存
         """
         self.db_path = db_path
         self.pool_size = pool_size
+        self.read_only = read_only
+        self.warm_statements = tuple(warm_statements)
         self._pool: Queue = Queue(maxsize=pool_size)
         self._lock = threading.Lock()
+        # 当前有效的连接（含已借出的）；关闭或换库后迟到归还的旧连接不在其中，归还时直接关闭
+        self._live: set = set()
+        self._live_lock = threading.Lock()
+        # run() 先在事件循环里等空闲连接名额，再进线程：连接全部占用时排队的是协程，不会占住线程池的线程
+        self._async_slots = asyncio.Semaphore(pool_size)
         self._initialized = False
     
     def initialize(self):
@@ -31,13 +76,94 @@ class DatabasePool:
         with self._lock:
             if self._initialized:
                 return
-            
+            self._open_connections()
+    
+    @property
+    def initialized(self) -> bool:
+        """是否已建好连接（数据库文件尚未生成时为 False）"""
+        return self._initialized
+    
+    def _open_connections(self) -> None:
+        """创建 pool_size 个连接放入池中（调用方持有 _lock）；中途失败时关闭已建的连接"""
+        try:
             for _ in range(self.pool_size):
-                conn = sqlite3.connect(self.db_path, check_same_thread=False)
-                conn.row_factory = sqlite3.Row  # 返回字典格式
+                conn = self._connect()  # 默认返回元组行，需要按列名取值时用 get_db_dict
+                pragmas = CONNECTION_PRAGMAS + READ_ONLY_PRAGMAS if self.read_only else WRITE_PRAGMAS + CONNECTION_PRAGMAS
+                for pragma in pragmas:
+                    conn.execute(pragma)
+                self._warm_up(conn)
+                with self._live_lock:
+                    self._live.add(conn)
                 self._pool.put(conn)
-            
-            self._initialized = True
+        except Exception:
+            self._close_connections()
+            raise
+        
+        self._initialized = True
+    
+    def _close_connections(self, timeout: float = 0.0) -> None:
+        """
+        关闭池中全部连接（调用方持有 _lock）
+        
+        已借出的连接最多等待 timeout 秒归还；超时仍未归还的，之后归还时直接关闭
+        """
+        deadline = time.monotonic() + timeout
+        while self._live:
+            try:
+                conn = self._pool.get(timeout=max(0.0, deadline - time.monotonic()))
+            except Empty:
+                break
+            with self._live_lock:
+                self._live.discard(conn)
+            try:
+                conn.execute("PRAGMA optimize")  # 关闭前更新查询规划统计
+            except sqlite3.Error:
+                pass
+            conn.close()
+        with self._live_lock:
+            self._live.clear()
+        self._initialized = False
+    
+    def replace_file(self, new_path: str, timeout: float = 5.0) -> None:
+        """
+        用 new_path 整个替换数据库文件，并按新文件重新建连
+        
+        先收回并关闭全部连接（否则 Windows 上无法替换、POSIX 上旧连接会继续读旧文件），
+        再原子替换文件、删除旧库残留的 -wal/-shm，最后重新创建连接；
+        替换失败时（如 Windows 上超时未归还的连接仍占用旧文件）照样按原文件重新建连，再抛出异常
+        
+        参数：
+        - new_path: 已写好的新数据库文件
+        - timeout: 等待已借出连接归还的最长秒数
+        """
+        with self._lock:
+            self._close_connections(timeout)
+            try:
+                os.replace(new_path, self.db_path)
+                for suffix in ("-wal", "-shm"):
+                    try:
+                        os.remove(self.db_path + suffix)
+                    except FileNotFoundError:
+                        pass
+            finally:
+                self._open_connections()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """创建一个新连接"""
+        if self.read_only:
+            uri = f"{pathlib.Path(self.db_path).resolve().as_uri()}?mode=ro"
+            return sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        return sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+    
+    def _warm_up(self, conn: sqlite3.Connection) -> None:
+        """预先执行热点查询，让语句进入该连接的缓存（表还不存在时跳过）"""
+        for sql, params in self.warm_statements:
+            try:
+                conn.execute(sql, params).fetchall()
+            except sqlite3.Error:
+                pass
     
     def get_connection(self, timeout: float = 5.0) -> Optional[sqlite3.Connection]:
         """
@@ -62,7 +188,11 @@ class DatabasePool:
         - conn: 数据库连接对象
         """
         if conn:
-            self._pool.put(conn)
+            with self._live_lock:
+                if conn in self._live:
+                    self._pool.put(conn)
+                    return
+            conn.close()  # 连接池已关闭或已换库，迟到归还的旧连接直接关闭
     
     @contextmanager
     def get_db(self):
@@ -86,16 +216,52 @@ class DatabasePool:
         finally:
             self.return_connection(conn)
     
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        在线程池中借用一个连接执行 func(conn, *args)，查询期间不阻塞事件循环
+        
+        用法：
+        ```python
+        def _fetch(conn, norm):
+            cur = conn.cursor()
+            cur.execute("SELECT word FROM entries WHERE word_norm = ?", (norm,))
+            return cur.fetchone()
+        
+        result = await db_pool.run(_fetch, norm)
+        ```
+        """
+        def _call() -> T:
+            with self.get_db() as conn:
+                return func(conn, *args)
+        async with self._async_slots:
+            return await asyncio.to_thread(_call)
+    
+    @contextmanager
+    def get_db_dict(self):
+        """
+        同 get_db，但结果行为 sqlite3.Row（可按列名取值），归还前恢复为元组行
+        
+        用法：
+        ```python
+        with db_pool.get_db_dict() as conn:
+            row = conn.execute("SELECT word FROM entries LIMIT 1").fetchone()
+            print(row["word"])
+        ```
+        """
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("无法从连接池获取数据库连接")
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.row_factory = None
+            self.return_connection(conn)
+    
     def close_all(self):
         """关闭所有连接（应用关闭时调用）"""
         with self._lock:
-            while not self._pool.empty():
-                try:
-                    conn = self._pool.get_nowait()
-                    conn.close()
-                except Empty:
-                    break
-            self._initialized = False
+            self._close_connections()
 
 
 # 全局连接池实例（会在main.py中初始化）
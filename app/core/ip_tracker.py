@@ -2,15 +2,17 @@
 IP追踪与访问记录模块
 
 功能：
-1. 获取用户IP和归属地（带缓存）
-2. 记录用户操作到数据库
+1. 获取用户IP和归属地（内存LRU + 数据库两级缓存）
+2. 记录用户操作到数据库（先进内存队列，后台批量写入）
 3. 定时导出CSV文件（每1分钟）
 4. 自动清理7天前的旧CSV文件
 """
 import os
 import csv
+import time
 import asyncio
 import httpx
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import Request
@@ -24,10 +26,32 @@ logger = get_logger(__name__)
 # IP归属地查询API
 IP_API_URL = "https://api.pearktrue.cn/api/ip/high/"
 IP_API_TIMEOUT = 5.0  # 5秒超时
+IP_API_CONCURRENCY = 16  # 同时最多16个归属地查询请求
+IP_MEM_CACHE_SIZE = 50000  # 内存缓存最多保留5万个IP
+
+# 归属地查询共用的HTTP客户端（在 start_ip_http_client 中创建，复用连接避免每次握手）
+_ip_http: Optional[httpx.AsyncClient] = None
+_ip_api_semaphore = asyncio.Semaphore(IP_API_CONCURRENCY)
+
+# 进程内IP归属地缓存（LRU，挡在 ip_cache 表前面）
+_ip_mem_cache: "OrderedDict[str, str]" = OrderedDict()
+_ip_mem_lock = asyncio.Lock()
+_ip_mem_stats = {"hits": 0, "misses": 0}
 
 # CSV导出配置
 CSV_EXPORT_INTERVAL = 60  # 60秒导出一次
 CSV_KEEP_DAYS = 7  # 保留最近7天
+CSV_FETCH_SIZE = 5000  # 导出时每次从数据库取5000行
+
+# 访问日志批量写入配置
+IP_LOG_BATCH_SIZE = 500  # 每批最多500条
+IP_LOG_FLUSH_INTERVAL = 0.2  # 最多攒0.2秒就写入
+IP_LOG_QUEUE_SIZE = 10000  # 队列最多积压1万条，满了直接丢弃
+
+# 待写入的访问日志队列与后台写入任务（在 start_ip_log_writer 中创建，绑定到运行中的事件循环）
+_ip_queue: Optional[asyncio.Queue] = None
+_ip_writer_task: Optional[asyncio.Task] = None
+_ip_dropped = 0  # 队列满时丢弃的记录数
 
 
 async def init_ip_tables():
@@ -82,9 +106,58 @@ async def init_ip_tables():
         logger.error(f"IP追踪表初始化失败: {e}", exc_info=True)
 
 
+async def _mem_cache_get(ip: str) -> Optional[str]:
+    """查内存缓存，命中则移到队尾"""
+    async with _ip_mem_lock:
+        location = _ip_mem_cache.get(ip)
+        if location is None:
+            _ip_mem_stats["misses"] += 1
+            return None
+        _ip_mem_cache.move_to_end(ip)
+        _ip_mem_stats["hits"] += 1
+        return location
+
+
+async def _mem_cache_put(ip: str, location: str) -> None:
+    """写入内存缓存，超出容量时淘汰最久未用的IP"""
+    async with _ip_mem_lock:
+        _ip_mem_cache[ip] = location
+        _ip_mem_cache.move_to_end(ip)
+        while len(_ip_mem_cache) > IP_MEM_CACHE_SIZE:
+            _ip_mem_cache.popitem(last=False)
+
+
+def get_ip_cache_stats() -> Dict[str, Any]:
+    """内存IP缓存命中统计"""
+    hits = _ip_mem_stats["hits"]
+    misses = _ip_mem_stats["misses"]
+    total = hits + misses
+    return {
+        "size": len(_ip_mem_cache),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else 0.0
+    }
+
+
+def _select_ip_cache(conn, ip: str):
+    cursor = conn.cursor()
+    cursor.execute("SELECT location FROM ip_cache WHERE ip = ?", (ip,))
+    return cursor.fetchone()
+
+
+def _save_ip_cache(conn, ip: str, location: str) -> None:
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT OR REPLACE INTO ip_cache (ip, location) VALUES (?, ?)",
+        (ip, location)
+    )
+    conn.commit()
+
+
 async def get_ip_location(ip: str) -> str:
     """
-    查询IP归属地（带缓存）
+    查询IP归属地（先查内存缓存，再查数据库缓存，最后调用API）
     
     参数：
         ip: IP地址
@@ -96,56 +169,56 @@ async def get_ip_location(ip: str) -> str:
     if ip in ("127.0.0.1", "localhost") or ip.startswith("192.168.") or ip.startswith("10."):
         return "本地网络"
     
+    # 1. 先查内存缓存
+    location = await _mem_cache_get(ip)
+    if location is not None:
+        return location
+    
     try:
-        # 1. 先查缓存
-        with app_state.activity_db_pool.get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT location FROM ip_cache WHERE ip = ?", (ip,))
-            result = cursor.fetchone()
-            if result:
-                return result[0]
+        # 2. 再查数据库缓存（在线程中查询，不阻塞事件循环）
+        result = await app_state.activity_db_pool.run(_select_ip_cache, ip)
+        if result:
+            await _mem_cache_put(ip, result[0])
+            return result[0]
+        
+        # 3. 缓存没有，调用API（共用连接，限制并发）
+        if _ip_http is None:
+            raise RuntimeError("IP查询客户端未启动")
+        async with _ip_api_semaphore:
+            response = await _ip_http.get(IP_API_URL, params={"ip": ip})
+        response.raise_for_status()
+        data = response.json()
         
-        # 2. 缓存没有，调用API
-        async with httpx.AsyncClient(timeout=IP_API_TIMEOUT) as client:
-            response = await client.get(IP_API_URL, params={"ip": ip})
-            response.raise_for_status()
-            data = response.json()
+        # 解析归属地（API返回格式可能不同，做兼容处理）
+        location = "未知地区"
+        if isinstance(data, dict):
+            # 兼容嵌套结构：优先从 data.data 里取（新API格式）
+            data_obj = data.get("data", data)  # 如果有 data 字段，就用它；否则用顶层对象
             
-            # 解析归属地（API返回格式可能不同，做兼容处理）
-            location = "未知地区"
-            if isinstance(data, dict):
-                # 兼容嵌套结构：优先从 data.data 里取（新API格式）
-                data_obj = data.get("data", data)  # 如果有 data 字段，就用它；否则用顶层对象
+            # 优先使用 address 字段（最详细：省+市+区+街道+社区）
+            if "address" in data_obj and data_obj["address"]:
+                location = data_obj["address"]
+            elif "detail" in data_obj and data_obj["detail"]:
+                # 备选：detail 字段（省+市+区）
+                location = data_obj["detail"]
+            else:
+                # 后备方案：拼接 province + city
+                province = data_obj.get("province", data_obj.get("region", ""))
+                city = data_obj.get("city", "")
                 
-                # 优先使用 address 字段（最详细：省+市+区+街道+社区）
-                if "address" in data_obj and data_obj["address"]:
-                    location = data_obj["address"]
-                elif "detail" in data_obj and data_obj["detail"]:
-                    # 备选：detail 字段（省+市+区）
-                    location = data_obj["detail"]
-                else:
-                    # 后备方案：拼接 province + city
-                    province = data_obj.get("province", data_obj.get("region", ""))
-                    city = data_obj.get("city", "")
-                    
-                    if province and city:
-                        location = f"{province}{city}"
-                    elif province:
-                        location = province
-                    elif city:
-                        location = city
-                    elif "location" in data_obj:
-                        location = data_obj["location"]
+                if province and city:
+                    location = f"{province}{city}"
+                elif province:
+                    location = province
+                elif city:
+                    location = city
+                elif "location" in data_obj:
+                    location = data_obj["location"]
         
-        # 3. 存入缓存
+        # 4. 存入缓存（内存 + 数据库）
+        await _mem_cache_put(ip, location)
         try:
-            with app_state.activity_db_pool.get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT OR REPLACE INTO ip_cache (ip, location) VALUES (?, ?)",
-                    (ip, location)
-                )
-                conn.commit()
+            await app_state.activity_db_pool.run(_save_ip_cache, ip, location)
         except Exception as e:
             logger.warning(f"缓存IP归属地失败: {e}")
         
@@ -159,42 +232,35 @@ async def get_ip_location(ip: str) -> str:
         return "未知地区"
 
 
-async def track_ip(
+def track_ip(
     request: Request,
     event_type: str,
     details: Optional[Dict[str, Any]] = None
-):
+) -> None:
     """
-    记录用户操作
+    记录用户操作（只放入内存队列，不等待归属地查询和数据库写入，也不会抛出异常）
     
     参数：
         request: FastAPI请求对象
         event_type: 事件类型（AI对话、查询单词、打开句子）
         details: 详细信息字典
     """
+    global _ip_dropped
     try:
         # 1. 获取IP
         ip = request.client.host
         if "x-forwarded-for" in request.headers:
             ip = request.headers["x-forwarded-for"].split(",")[0].strip()
         
-        # 2. Session ID（已移除在线统计功能，保留字段为空）
-        session_id = ""
-        
-        # 3. 查询归属地（异步，带缓存）
-        location = await get_ip_location(ip)
-        
-        # 4. 解析详情
+        # 2. 解析详情
         detail_key = ""
         detail_value = ""
-        detail_extra = ""
         
         if details:
             if event_type == "AI对话":
                 # 为了用户隐私，不记录AI对话的具体内容
                 detail_key = ""
                 detail_value = ""
-                detail_extra = ""
             elif event_type == "查询单词":
                 detail_key = "word"
                 detail_value = details.get("word", "")
@@ -202,31 +268,154 @@ async def track_ip(
                 detail_key = "filename"
                 detail_value = details.get("filename", "")
         
-        # 5. 记录到数据库
-        with app_state.activity_db_pool.get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO ip_access_log 
-                (event_type, ip, location, session_id, detail_key, detail_value, detail_extra)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (event_type, ip, location, session_id, detail_key, detail_value, detail_extra))
-            conn.commit()
+        # 3. 放入写入队列（归属地由后台任务查询后批量写入数据库，时间与 CURRENT_TIMESTAMP 一致为UTC）
+        if _ip_queue is None:
+            raise RuntimeError("访问日志写入任务未启动")
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        _ip_queue.put_nowait((timestamp, event_type, ip, detail_key, detail_value))
+        
+    except asyncio.QueueFull:
+        # 队列已满（写入跟不上），丢弃本条记录并计数
+        _ip_dropped += 1
+        if _ip_dropped % 1000 == 1:
+            logger.warning(f"访问日志队列已满，已丢弃 {_ip_dropped} 条记录")
+    except Exception as e:
+        # 记录失败不影响正常功能
+        logger.warning(f"IP追踪记录失败: {e}")
+
+
+def get_ip_log_stats() -> Dict[str, Any]:
+    """访问日志队列统计"""
+    return {
+        "queued": _ip_queue.qsize() if _ip_queue is not None else 0,
+        "dropped": _ip_dropped,
+    }
+
+
+async def _resolve_events(events: list) -> list:
+    """为一批事件查询归属地（同一批内的IP去重后并发查询），返回待写入的数据库行"""
+    ips = list({e[2] for e in events})
+    locations = dict(zip(ips, await asyncio.gather(*(get_ip_location(ip) for ip in ips))))
+    rows = []
+    for timestamp, event_type, ip, detail_key, detail_value in events:
+        location = locations[ip]
+        rows.append((timestamp, event_type, ip, location, "", detail_key, detail_value, ""))
         
-        # 6. 输出详细日志
+        # 输出详细日志（为了用户隐私，不显示AI对话的具体内容）
         log_detail = ""
-        if event_type == "AI对话":
-            # 为了用户隐私，不显示AI对话的具体内容
-            log_detail = ""
-        elif event_type == "查询单词" and detail_value:
+        if event_type == "查询单词" and detail_value:
             log_detail = f" | 单词: {detail_value}"
         elif event_type == "打开句子" and detail_value:
             log_detail = f" | 文件: {detail_value}"
-        
         logger.info(f"记录操作: {event_type} | IP: {ip} | {location}{log_detail}")
-        
-    except Exception as e:
-        # 记录失败不影响正常功能
-        logger.warning(f"IP追踪记录失败: {e}")
+    return rows
+
+
+def _rows_without_lookup(events: list) -> list:
+    """关闭时不再发起网络查询，只用内存缓存里的归属地"""
+    return [
+        (timestamp, event_type, ip, _ip_mem_cache.get(ip, "未知地区"), "", detail_key, detail_value, "")
+        for timestamp, event_type, ip, detail_key, detail_value in events
+    ]
+
+
+def _insert_access_logs(events: list) -> None:
+    """批量写入访问日志（一次事务）"""
+    with app_state.activity_db_pool.get_db() as conn:
+        conn.executemany("""
+            INSERT INTO ip_access_log 
+            (timestamp, event_type, ip, location, session_id, detail_key, detail_value, detail_extra)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, events)
+        conn.commit()
+
+
+async def ip_log_writer_task(queue: asyncio.Queue):
+    """
+    后台任务：批量写入访问日志
+    攒够 IP_LOG_BATCH_SIZE 条或等待 IP_LOG_FLUSH_INTERVAL 秒后，一次事务写入
+    """
+    loop = asyncio.get_running_loop()
+    batch: list = []
+    try:
+        while True:
+            batch.append(await queue.get())
+            deadline = loop.time() + IP_LOG_FLUSH_INTERVAL
+            while len(batch) < IP_LOG_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            events, batch = batch, []
+            try:
+                try:
+                    rows = await _resolve_events(events)
+                except asyncio.CancelledError:
+                    # 关闭时归属地还没查完：这批放回 batch，由下面的关闭处理不带归属地写入
+                    batch = events + batch
+                    raise
+                write = asyncio.ensure_future(asyncio.to_thread(_insert_access_logs, rows))
+                try:
+                    await asyncio.shield(write)
+                except asyncio.CancelledError:
+                    # 写入线程不会随任务取消而停止：等它写完再退出，这批不再重复写入
+                    await asyncio.wait({write})
+                    raise
+            except Exception as e:
+                logger.warning(f"访问日志写入失败（{len(events)}条）: {e}")
+    except asyncio.CancelledError:
+        # 关闭时写入剩余记录
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        if batch:
+            try:
+                _insert_access_logs(_rows_without_lookup(batch))
+                logger.info(f"关闭前写入剩余访问日志 {len(batch)} 条")
+            except Exception as e:
+                logger.warning(f"剩余访问日志写入失败: {e}")
+        raise
+
+
+def start_ip_http_client() -> None:
+    """创建归属地查询共用的HTTP客户端"""
+    global _ip_http
+    if _ip_http is None:
+        _ip_http = httpx.AsyncClient(
+            timeout=IP_API_TIMEOUT,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+
+
+async def close_ip_http_client() -> None:
+    """关闭归属地查询HTTP客户端"""
+    global _ip_http
+    if _ip_http is not None:
+        await _ip_http.aclose()
+        _ip_http = None
+
+
+def start_ip_log_writer() -> None:
+    """启动访问日志写入任务"""
+    global _ip_queue, _ip_writer_task
+    if _ip_writer_task is None or _ip_writer_task.done():
+        _ip_queue = asyncio.Queue(maxsize=IP_LOG_QUEUE_SIZE)
+        _ip_writer_task = asyncio.create_task(ip_log_writer_task(_ip_queue))
+
+
+async def stop_ip_log_writer() -> None:
+    """停止访问日志写入任务（会先写入剩余记录）"""
+    global _ip_writer_task
+    if _ip_writer_task is None:
+        return
+    _ip_writer_task.cancel()
+    try:
+        await _ip_writer_task
+    except asyncio.CancelledError:
+        pass
+    _ip_writer_task = None
 
 
 async def export_csv_task():
@@ -245,20 +434,20 @@ async def export_csv_task():
             logger.error(f"CSV导出任务异常: {e}", exc_info=True)
 
 
-async def export_today_csv():
-    """导出今天的访问记录为CSV"""
-    try:
-        # 1. 获取今天的日期
-        today = datetime.now().strftime("%Y%m%d")
-        csv_dir = os.path.join(BASE_DIR, "logs", "ip")
-        os.makedirs(csv_dir, exist_ok=True)
-        
-        csv_file = os.path.join(csv_dir, f"ip_access_{today}.csv")
-        
-        # 2. 从数据库读取今天的记录（只要详情1，不要详情2）
-        with app_state.activity_db_pool.get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
+def _export_today_csv_sync():
+    """导出今天的访问记录为CSV（同步实现，在线程中运行）"""
+    # 1. 获取今天的日期
+    today = datetime.now().strftime("%Y%m%d")
+    csv_dir = os.path.join(BASE_DIR, "logs", "ip")
+    os.makedirs(csv_dir, exist_ok=True)
+    
+    csv_file = os.path.join(csv_dir, f"ip_access_{today}.csv")
+    
+    # 2. 从数据库分批读取今天的记录（只要详情1，不要详情2），边读边写，内存占用固定
+    record_count = 0
+    with app_state.activity_db_pool.get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
                 SELECT 
                     strftime('%Y-%m-%d %H:%M:%S', timestamp) as time,
                     event_type,
@@ -270,7 +459,6 @@ async def export_today_csv():
                 WHERE DATE(timestamp) = DATE('now', 'localtime')
                 ORDER BY timestamp ASC
             """)
-            records = cursor.fetchall()
         
         # 3. 写入CSV（UTF-8-BOM编码，Windows Excel完美打开）
         with open(csv_file, 'w', newline='', encoding='utf-8-sig') as f:
@@ -278,43 +466,57 @@ async def export_today_csv():
             # 表头（去掉"详情2"列）
             writer.writerow(['时间', '事件类型', 'IP地址', '归属地', '会话ID', '详情'])
             # 数据行
-            writer.writerows(records)
-        
-        logger.info(f"CSV导出成功: {csv_file} ({len(records)}条记录)")
-        
+            while True:
+                records = cursor.fetchmany(CSV_FETCH_SIZE)
+                if not records:
+                    break
+                writer.writerows(records)
+                record_count += len(records)
+    
+    logger.info(f"CSV导出成功: {csv_file} ({record_count}条记录)")
+
+
+async def export_today_csv():
+    """导出今天的访问记录为CSV（数据库读取和文件写入放到线程中，不阻塞事件循环）"""
+    try:
+        await asyncio.to_thread(_export_today_csv_sync)
     except Exception as e:
         logger.error(f"CSV导出失败: {e}", exc_info=True)
 
 
+def _cleanup_old_csv_sync():
+    """清理7天前的旧CSV文件（同步实现，在线程中运行）"""
+    csv_dir = os.path.join(BASE_DIR, "logs", "ip")
+    if not os.path.exists(csv_dir):
+        return
+    
+    # 计算7天前的日期
+    cutoff_date = datetime.now() - timedelta(days=CSV_KEEP_DAYS)
+    cutoff_str = cutoff_date.strftime("%Y%m%d")
+    
+    # 遍历CSV文件
+    deleted_count = 0
+    for filename in os.listdir(csv_dir):
+        if filename.startswith("ip_access_") and filename.endswith(".csv"):
+            # 提取日期：ip_access_20251003.csv → 20251003
+            try:
+                date_str = filename[10:18]  # 截取日期部分
+                if date_str < cutoff_str:
+                    file_path = os.path.join(csv_dir, filename)
+                    os.remove(file_path)
+                    deleted_count += 1
+                    logger.info(f"删除旧CSV: {filename}")
+            except Exception as e:
+                logger.warning(f"清理文件失败 [{filename}]: {e}")
+    
+    if deleted_count > 0:
+        logger.info(f"清理完成，删除了 {deleted_count} 个旧CSV文件")
+
+
 async def cleanup_old_csv():
-    """清理7天前的旧CSV文件"""
+    """清理7天前的旧CSV文件（文件操作放到线程中）"""
     try:
-        csv_dir = os.path.join(BASE_DIR, "logs", "ip")
-        if not os.path.exists(csv_dir):
-            return
-        
-        # 计算7天前的日期
-        cutoff_date = datetime.now() - timedelta(days=CSV_KEEP_DAYS)
-        cutoff_str = cutoff_date.strftime("%Y%m%d")
-        
-        # 遍历CSV文件
-        deleted_count = 0
-        for filename in os.listdir(csv_dir):
-            if filename.startswith("ip_access_") and filename.endswith(".csv"):
-                # 提取日期：ip_access_20251003.csv → 20251003
-                try:
-                    date_str = filename[10:18]  # 截取日期部分
-                    if date_str < cutoff_str:
-                        file_path = os.path.join(csv_dir, filename)
-                        os.remove(file_path)
-                        deleted_count += 1
-                        logger.info(f"删除旧CSV: {filename}")
-                except Exception as e:
-                    logger.warning(f"清理文件失败 [{filename}]: {e}")
-        
-        if deleted_count > 0:
-            logger.info(f"清理完成，删除了 {deleted_count} 个旧CSV文件")
-            
+        await asyncio.to_thread(_cleanup_old_csv_sync)
     except Exception as e:
         logger.error(f"CSV清理失败: {e}", exc_info=True)
 
@@ -1,8 +1,8 @@
-import json
 import time
+import asyncio
 import threading
-from datetime import datetime
-from typing import Dict, Any, Optional
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple
 
 
 class LoadingStateStore:
@@ -22,13 +22,47 @@ class LoadingStateStore:
     def __init__(self):
         self.lock = threading.Lock()
         self.state: Dict[str, Any] = self.DEFAULT_STATE.copy()
+        # 已处理行数单独存放：只有加载线程写入，整数赋值在 GIL 下是原子的，不需要加锁
+        self._processed = 0
+        # 加载结束时要通知的事件（事件属于某个事件循环，加载线程通过 call_soon_threadsafe 设置）
+        self._finish_listeners: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        # 状态变化时要通知的事件（SSE 推送等待它，不再定时轮询 snapshot）
+        self._change_listeners: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    @staticmethod
+    def _format_timestamp(ts: Optional[float]) -> Optional[str]:
+        """内部用 time.time() 记录，读取时再格式化为 UTC ISO 字符串"""
+        if ts is None:
+            return None
+        return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+
+    @staticmethod
+    def _notify(listeners: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]) -> None:
+        """在各自的事件循环中设置事件（可从加载线程调用）"""
+        for loop, event in listeners:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    def _notify_change(self) -> None:
+        self._notify(list(self._change_listeners))
 
     def snapshot(self) -> Dict[str, Any]:
         with self.lock:
-            return json.loads(json.dumps(self.state))
+            st = self.state
+            snap = {**st, "latest_words": list(st["latest_words"])}
+        processed = self._processed
+        total = snap["total_words"] or 0
+        snap["processed_words"] = processed
+        snap["percent"] = (processed / total * 100.0) if total > 0 else 0.0
+        snap["timestamp"] = self._format_timestamp(snap["timestamp"])
+        return snap
 
-    def reset_for_file(self, file_name: str, total_rows: int) -> None:
+    def reset_for_file(self, file_name: str, total_rows: Optional[int] = None) -> None:
         with self.lock:
+            self._processed = 0
             self.state = self.DEFAULT_STATE.copy()
             self.state.update({
                 "running": True,
@@ -39,42 +73,82 @@ class LoadingStateStore:
                 "percent": 0.0,
                 "error": None,
                 "latest_words": [],
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": time.time(),
             })
+        self._notify_change()
+
+    def set_total_words(self, total: int) -> None:
+        with self.lock:
+            self.state["total_words"] = int(total or 0)
+            self.state["timestamp"] = time.time()
+        self._notify_change()
+
+    def add_total_words(self, increment: int) -> None:
+        with self.lock:
+            self.state["total_words"] = self.state.get("total_words", 0) + increment
+            self.state["timestamp"] = time.time()
+        self._notify_change()
 
     def set_current_sheet(self, sheet: Optional[str]) -> None:
         with self.lock:
             self.state["current_sheet"] = sheet
-            self.state["timestamp"] = datetime.utcnow().isoformat()
+            self.state["timestamp"] = time.time()
+        self._notify_change()
 
     def increment_processed(self, increment: int = 1, sample_word: Optional[str] = None,
                             sample_step: int = 10, latest_limit: int = 40) -> int:
+        processed = self._processed + increment
+        self._processed = processed
+        # 只有需要采样展示单词时才加锁
+        if sample_word and sample_word.strip() and processed % sample_step == 0:
+            with self.lock:
+                latest = list(self.state.get("latest_words") or [])
+                latest.append(sample_word)
+                if len(latest) > latest_limit:
+                    latest = latest[-latest_limit:]
+                self.state["latest_words"] = latest
+                # 只有展示的单词变化时才刷新时间戳
+                self.state["timestamp"] = time.time()
+        # 进度每跨过1%通知一次（总数未知时不通知）
+        total = self.state["total_words"]
+        if total > 0:
+            step = max(1, total // 100)
+            if processed // step != (processed - increment) // step:
+                self._notify_change()
+        return processed
+
+    def add_change_listener(self, loop: asyncio.AbstractEventLoop, event: asyncio.Event) -> None:
+        """注册状态变化事件：状态变化（含进度每跨过1%）时在 loop 中设置 event"""
+        with self.lock:
+            self._change_listeners.append((loop, event))
+
+    def remove_change_listener(self, event: asyncio.Event) -> None:
+        with self.lock:
+            self._change_listeners = [(l, e) for l, e in self._change_listeners if e is not event]
+
+    def add_finish_listener(self, loop: asyncio.AbstractEventLoop, event: asyncio.Event) -> None:
+        """注册加载结束事件：mark_finished 时在 loop 中设置 event"""
+        with self.lock:
+            self._finish_listeners.append((loop, event))
+
+    def remove_finish_listener(self, event: asyncio.Event) -> None:
         with self.lock:
-            processed = self.state.get("processed_words", 0) + increment
-            self.state["processed_words"] = processed
-            total = self.state.get("total_words", 0) or 0
-            self.state["percent"] = (processed / total * 100.0) if total > 0 else 0.0
-            if sample_word and sample_word.strip():
-                if processed % sample_step == 0:
-                    latest = list(self.state.get("latest_words") or [])
-                    latest.append(sample_word)
-                    if len(latest) > latest_limit:
-                        latest = latest[-latest_limit:]
-                    self.state["latest_words"] = latest
-            self.state["timestamp"] = datetime.utcnow().isoformat()
-            return processed
+            self._finish_listeners = [(l, e) for l, e in self._finish_listeners if e is not event]
 
     def mark_finished(self, error: Optional[str] = None) -> None:
         with self.lock:
             self.state["running"] = False
             if error:
                 self.state["error"] = error
-            self.state["timestamp"] = datetime.utcnow().isoformat()
+            self.state["timestamp"] = time.time()
+            listeners = self._finish_listeners + self._change_listeners
+        self._notify(listeners)
 
     def clear_error(self) -> None:
         with self.lock:
             self.state["error"] = None
-            self.state["timestamp"] = datetime.utcnow().isoformat()
+            self.state["timestamp"] = time.time()
+        self._notify_change()
 
 
 # 全局单例
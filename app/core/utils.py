@@ -1,14 +1,48 @@
 import re
+from functools import lru_cache
 from typing import List
 
 
+_WORD_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-'"
+# ASCII 转换表：允许的字符保持不变，其余字符替换为空格
+_NORM_TABLE = {i: (chr(i) if chr(i) in _WORD_CHARS else " ") for i in range(128)}
+_NON_WORD_RE = re.compile(r"[^A-Za-z\-']+")
+
+
+# 查询接口反复标准化同一批常用词，缓存结果（入参都是 str，可哈希）
+@lru_cache(maxsize=8192)
 def normalize_word(word: str) -> str:
     """标准化单词：保留字母、连字符、撇号，转小写"""
     if word is None:
         return ""
-    text = str(word).strip()
-    text = re.sub(r"[^A-Za-z\-']+", " ", text).strip().lower()
-    return text
+    text = str(word)
+    if text.isascii():
+        # 快速路径：str.translate 在 C 层逐字符替换，split/join 合并连续空格并去掉首尾空格
+        return " ".join(text.translate(_NORM_TABLE).split()).lower()
+    return _NON_WORD_RE.sub(" ", text.strip()).strip().lower()
+
+
+# 批量标准化用 NUL 作分隔符（xlsx 单元格内容不可能包含 NUL），转换表中保留它
+_BATCH_NORM_TABLE = {**_NORM_TABLE, 0: "\0"}
+_NON_WORD_BATCH_RE = re.compile(r"[^A-Za-z\-'\0]+")
+_MULTI_SPACE_RE = re.compile(r" {2,}")
+
+
+def normalize_words(words: List[str]) -> List[str]:
+    """批量标准化单词：拼接成一个字符串整体处理，结果与逐个调用 normalize_word 相同"""
+    if not words:
+        return []
+    text = "\0".join(words)
+    if text.count("\0") != len(words) - 1:
+        # 单词本身含有 NUL，无法按分隔符拆回，逐个处理
+        return [normalize_word(w) for w in words]
+    if text.isascii():
+        text = text.translate(_BATCH_NORM_TABLE)
+    else:
+        text = _NON_WORD_BATCH_RE.sub(" ", text)
+    # 合并连续空格，再去掉每个单词首尾的空格
+    text = _MULTI_SPACE_RE.sub(" ", text).replace(" \0", "\0").replace("\0 ", "\0").strip(" ")
+    return text.lower().split("\0")
 
 
 def natural_sort_key(s: str):
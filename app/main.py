@@ -1,21 +1,27 @@
 import os
 import time
 import asyncio
+import httpx
 from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from core.config import (
-    TEMPLATES_DIR, STATIC_DIR, SQLITE_DB_PATH, USER_ACTIVITY_DB_PATH, BASE_DIR,
+    TEMPLATES_DIR, STATIC_DIR, TODAY_PHRASE_DIR, SQLITE_DB_PATH, USER_ACTIVITY_DB_PATH, BASE_DIR,
     EXCEL_EXTENSIONS
 )
 from core.database import start_loading
-from core.db_pool import DatabasePool
+from core.db_pool import DatabasePool, default_read_pool_size
 from core.logger import setup_logging, get_logger
 from core.app_state import app_state
-from core.ip_tracker import init_ip_tables, export_csv_task
+from core.ip_tracker import (
+    init_ip_tables, export_csv_task, start_ip_log_writer, stop_ip_log_writer, get_ip_cache_stats,
+    get_ip_log_stats, start_ip_http_client, close_ip_http_client
+)
 from routers import todayphrase, sentences, excel, lookup, wordbook, ai
 from routers.todayphrase import preprocess_todayphrase_startup
 
@@ -24,39 +30,40 @@ setup_logging(log_dir="logs", level=20)  # 20 = INFO
 logger = get_logger(__name__)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """应用生命周期管理（启动和关闭时的操作）- 顺序执行，避免冲突"""
-    # 启动时执行（按顺序一个一个来）
-    logger.info("应用启动中...")
-    app_state.start_time = time.time()
-    
-    # 初始化用户行为数据库连接池
-    logger.info("正在初始化用户行为数据库...")
-    try:
-        activity_pool = DatabasePool(USER_ACTIVITY_DB_PATH, pool_size=3)
-        activity_pool.initialize()
-        app_state.activity_db_pool = activity_pool
-        logger.info("用户行为数据库初始化完成")
-    except Exception as e:
-        logger.error(f"用户行为数据库初始化失败: {e}", exc_info=True)
-    
-    # 初始化IP追踪表
+EXCEL_LOAD_TIMEOUT = 120  # 启动时最多等待Excel加载120秒
+
+
+async def _log_loading_progress(interval: float = 10.0):
+    """启动等待期间每10秒输出一次加载进度"""
+    from core.loading import loading_state
+    while True:
+        await asyncio.sleep(interval)
+        snap = loading_state.snapshot()
+        logger.info(f"加载进度: {snap.get('processed_words', 0)}/{snap.get('total_words', 0)}")
+
+
+async def _startup_init_ip_tables():
+    """启动步骤：初始化IP追踪表"""
     logger.info("正在初始化IP追踪表...")
     try:
         await init_ip_tables()
         logger.info("IP追踪表初始化完成")
     except Exception as e:
         logger.error(f"IP追踪表初始化失败: {e}", exc_info=True)
-    
-    # 预处理今日一签
+
+
+async def _startup_todayphrase():
+    """启动步骤：预处理今日一签（图片转换在线程中进行）"""
     logger.info("正在预处理今日一签...")
     try:
-        preprocess_todayphrase_startup()
-        logger.info("今日一签预处理完成")
+        app_state.todayphrase_name = await asyncio.to_thread(preprocess_todayphrase_startup)
+        logger.info(f"今日一签预处理完成: {app_state.todayphrase_name}")
     except Exception as e:
         logger.warning(f"今日一签预处理失败: {e}")
-    
+
+
+def _remove_old_db_files():
+    """启动步骤：删除旧数据库文件"""
     # 删除旧数据库文件（总是重新加载，保证数据最新且干净）
     logger.info("正在清理旧数据库...")
     try:
@@ -78,16 +85,18 @@ async def lifespan(app: FastAPI):
             logger.info("已删除SHM文件")
     except Exception as e:
         logger.error(f"清理旧数据库失败: {e}", exc_info=True)
-    
-    # 查找Excel文件
+
+
+def _find_excel_to_load() -> Optional[str]:
+    """启动步骤：查找要加载的Excel文件"""
     logger.info("正在查找Excel文件...")
-    excel_to_load = None
+    excel_to_load: Optional[str] = None
     try:
-        excel_candidates = [
-            name for name in os.listdir(BASE_DIR)
-            if os.path.isfile(os.path.join(BASE_DIR, name))
-            and os.path.splitext(name)[1].lower() in EXCEL_EXTENSIONS
-        ]
+        with os.scandir(BASE_DIR) as it:
+            excel_candidates = [
+                entry.name for entry in it
+                if os.path.splitext(entry.name)[1].lower() in EXCEL_EXTENSIONS and entry.is_file()
+            ]
         excel_candidates.sort()
         if excel_candidates:
             excel_to_load = os.path.join(BASE_DIR, excel_candidates[0])
@@ -96,44 +105,110 @@ async def lifespan(app: FastAPI):
             logger.error("未找到Excel文件，无法启动")
     except Exception as e:
         logger.error(f"查找Excel文件失败: {e}", exc_info=True)
+    return excel_to_load
+
+
+async def _startup_load_excel():
+    """启动步骤：清理旧数据库、查找并加载Excel，等待加载完成"""
+    # 清理旧数据库和查找Excel互不依赖，同时进行；两者都完成后才能开始加载
+    _, excel_to_load = await asyncio.gather(
+        asyncio.to_thread(_remove_old_db_files),
+        asyncio.to_thread(_find_excel_to_load),
+    )
     
     # 加载Excel（总是加载）
     if excel_to_load:
         logger.info(f"正在加载Excel文件: {os.path.basename(excel_to_load)}")
         try:
-            start_loading(excel_to_load)
-            
-            # 等待加载完成（最多等120秒）
+            # 加载线程结束时通过事件通知，不再每秒轮询状态
             from core.loading import loading_state
-            for i in range(120):
-                await asyncio.sleep(1)
+            done_event = asyncio.Event()
+            loading_state.add_finish_listener(asyncio.get_running_loop(), done_event)
+            progress_task = asyncio.create_task(_log_loading_progress())
+            try:
+                start_loading(excel_to_load)
+                
+                # 等待加载完成（最多等120秒）
+                await asyncio.wait_for(done_event.wait(), timeout=EXCEL_LOAD_TIMEOUT)
                 snap = loading_state.snapshot()
-                if not snap.get("running"):
-                    if snap.get("error"):
-                        logger.error(f"Excel加载失败: {snap.get('error')}")
-                    else:
-                        logger.info("Excel加载完成")
-                        # 设置当前Excel文件
-                        app_state.current_excel_file = excel_to_load
-                    break
-                if i % 10 == 0 and i > 0:
-                    logger.info(f"加载进度: {snap.get('processed', 0)}/{snap.get('total_rows', 0)}")
-            else:
+                if snap.get("error"):
+                    logger.error(f"Excel加载失败: {snap.get('error')}")
+                else:
+                    logger.info("Excel加载完成")
+                    # 设置当前Excel文件
+                    app_state.current_excel_file = excel_to_load
+            except asyncio.TimeoutError:
                 logger.warning("Excel加载超时")
+            finally:
+                progress_task.cancel()
+                loading_state.remove_finish_listener(done_event)
         except Exception as e:
             logger.error(f"Excel加载失败: {e}", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期管理（启动和关闭时的操作）- 有依赖的步骤顺序执行，互不依赖的并发执行"""
+    # 启动时执行
+    logger.info("应用启动中...")
+    app_state.start_time = time.time()
     
-    # 初始化单词数据库连接池
-    logger.info("正在初始化单词数据库连接池...")
+    # 初始化用户行为数据库连接池
+    logger.info("正在初始化用户行为数据库...")
     try:
-        import core.db_pool as pool_module
-        pool_module.db_pool = DatabasePool(SQLITE_DB_PATH, pool_size=2)
-        pool_module.db_pool.initialize()
-        app_state.db_pool = pool_module.db_pool
-        app_state.data_loaded = True
-        logger.info("单词数据库连接池初始化完成")
+        activity_pool = DatabasePool(USER_ACTIVITY_DB_PATH, pool_size=3)
+        activity_pool.initialize()
+        app_state.activity_db_pool = activity_pool
+        logger.info("用户行为数据库初始化完成")
     except Exception as e:
-        logger.error(f"单词数据库连接池初始化失败: {e}", exc_info=True)
+        logger.error(f"用户行为数据库初始化失败: {e}", exc_info=True)
+    
+    # 单词数据库连接池先创建、暂不建连：数据库文件由加载线程生成，替换文件后由连接池自行建连
+    import core.db_pool as pool_module
+    # 单词库只读：所有写入都在加载线程的独立连接中完成（唯一的写连接）
+    pool_module.db_pool = DatabasePool(
+        SQLITE_DB_PATH, pool_size=default_read_pool_size(), read_only=True,
+        warm_statements=lookup.LOOKUP_WARM_STATEMENTS
+    )
+    app_state.db_pool = pool_module.db_pool
+    
+    # 互不依赖的启动步骤并发执行（各步骤内部自行记录异常）
+    await asyncio.gather(
+        _startup_init_ip_tables(),
+        _startup_todayphrase(),
+        _startup_load_excel(),
+        return_exceptions=True,
+    )
+    
+    # 初始化单词数据库连接池（加载成功时替换文件已顺带建连，这里不会重复建连）
+    # data_loaded 只由加载线程在导入成功后设置，超时或失败时保持 False
+    if os.path.exists(SQLITE_DB_PATH):
+        logger.info("正在初始化单词数据库连接池...")
+        try:
+            app_state.db_pool.initialize()
+            logger.info("单词数据库连接池初始化完成")
+        except Exception as e:
+            logger.error(f"单词数据库连接池初始化失败: {e}", exc_info=True)
+    else:
+        # 加载超时或失败：数据库文件尚未生成，只读连接打不开，等加载线程替换文件时再建连
+        logger.warning("单词数据库尚未生成，连接池将在加载完成后建立")
+    
+    # 创建IP归属地查询客户端（复用连接）
+    start_ip_http_client()
+    
+    # 创建AI接口共用的HTTP客户端（长连接复用，各请求自行指定超时）
+    app_state.http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(30.0, read=90.0),
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+    )
+    
+    # 启动访问日志批量写入任务
+    logger.info("正在启动访问日志写入任务...")
+    try:
+        start_ip_log_writer()
+        logger.info("访问日志写入任务启动完成")
+    except Exception as e:
+        logger.error(f"访问日志写入任务启动失败: {e}", exc_info=True)
     
     # 启动CSV导出后台任务
     logger.info("正在启动CSV导出任务...")
@@ -158,6 +233,26 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.error(f"关闭单词数据库连接池失败: {e}")
     
+    # 写入剩余的访问日志（必须在关闭用户行为数据库连接池之前）
+    try:
+        await stop_ip_log_writer()
+    except Exception as e:
+        logger.error(f"停止访问日志写入任务失败: {e}")
+    
+    # 关闭IP归属地查询客户端
+    try:
+        await close_ip_http_client()
+    except Exception as e:
+        logger.error(f"关闭IP查询客户端失败: {e}")
+    
+    # 关闭AI接口HTTP客户端
+    if app_state.http_client:
+        try:
+            await app_state.http_client.aclose()
+            app_state.http_client = None
+        except Exception as e:
+            logger.error(f"关闭AI接口HTTP客户端失败: {e}")
+    
     # 关闭用户行为数据库连接池
     if app_state.activity_db_pool:
         try:
@@ -169,10 +264,15 @@ async def lifespan(app: FastAPI):
     logger.info("应用已关闭")
 
 
-app = FastAPI(title="连词成句 - FastAPI 版", lifespan=lifespan)
+# 默认用 orjson 序列化接口返回值（C实现，比标准库json快）
+app = FastAPI(title="连词成句 - FastAPI 版", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# 压缩较大的响应（AI 接口的 raw 字段可达数百 KB）；text/event-stream 的 SSE 流中间件不压缩，事件不会被缓冲
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # 挂载静态文件与模板
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+app.mount("/todayphrase", todayphrase.TodayPhraseStaticFiles(directory=TODAY_PHRASE_DIR), name="todayphrase")
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
 # 注册所有路由
@@ -202,19 +302,20 @@ async def health_check():
         uptime_hours = uptime_seconds // 3600
         uptime_minutes = (uptime_seconds % 3600) // 60
         
-        # 检查数据库连接
+        # 检查数据库连接（单词总数在加载完成时已统计，只有缺失时才查询一次并缓存）
         db_status = "未初始化"
-        if app_state.db_pool:
+        if app_state.db_pool and app_state.db_pool.initialized:
             try:
-                with app_state.db_pool.get_db() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT COUNT(*) FROM entries")
-                    word_count = cursor.fetchone()[0]
-                    db_status = f"正常 ({word_count}个单词)"
+                word_count = app_state.word_count
+                if word_count is None:
+                    # 与批次列表共用同一查询，在连接池的工作线程中执行，不阻塞事件循环
+                    word_count = await app_state.db_pool.run(wordbook._count_entries)
+                    app_state.word_count = word_count
+                db_status = f"正常 ({word_count}个单词)"
             except Exception as e:
                 db_status = f"异常: {str(e)}"
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "healthy",
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
             "uptime": f"{uptime_hours}小时 {uptime_minutes}分钟",
@@ -224,13 +325,15 @@ async def health_check():
                 "current_file": os.path.basename(app_state.current_excel_file) if app_state.current_excel_file else None
             },
             "connection_pool": {
-                "initialized": app_state.db_pool is not None,
+                "initialized": bool(app_state.db_pool and app_state.db_pool.initialized),
                 "pool_size": app_state.db_pool.pool_size if app_state.db_pool else 0
-            }
+            },
+            "ip_cache": get_ip_cache_stats(),
+            "ip_log": get_ip_log_stats()
         })
     except Exception as e:
         logger.error(f"健康检查失败: {e}", exc_info=True)
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "unhealthy",
             "error": str(e)
         }, status_code=500)
@@ -240,10 +343,14 @@ if __name__ == "__main__":
     import uvicorn
     
     # 生产模式：单进程，稳定可靠（2核2G服务器推荐配置）
+    # 不开多 worker：加载状态、单词库重建、访问日志队列和CSV导出都在进程内，多进程会各自一份
+    # 事件循环和HTTP解析用 auto：装了 uvloop / httptools（见 requirements.txt）就自动使用，Windows 上回退到 asyncio
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=5000,
+        loop="auto",
+        http="auto",
         log_level="info",           # 保留重要日志
         limit_concurrency=300,      # 最大并发连接数
         timeout_keep_alive=120      # Keep-Alive 超时时间
@@ -1,11 +1,14 @@
-import json
+import os
+import orjson
 from typing import List, Dict, Any, AsyncGenerator
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 import httpx
+import random
 import asyncio
 
 from core.config import APIKEY_PATH
+from core.app_state import app_state
 from core.logger import get_logger
 from core.ip_tracker import track_ip
 
@@ -15,19 +18,33 @@ logger = get_logger(__name__)
 # AI接口配置
 AI_TIMEOUT = 30.0  # 超时时间：30秒
 AI_MAX_RETRIES = 3  # 最大重试次数：3次
+AI_STREAM_TIMEOUT = 90.0  # 流式响应超时：90秒
+AI_RETRY_MAX_WAIT = 8.0  # 重试等待上限：8秒
+AI_NON_RETRYABLE_STATUS = (501, 505, 511)  # 重试也不会成功的5xx状态码
+
+
+# API 密钥缓存：以文件修改时间和大小为键，文件变化后下次调用自动重新读取
+_api_keys_cache: Dict[str, Any] = {"stamp": None, "keys": []}
 
 
 def _load_api_keys_raw() -> List[str]:
-    """加载原始 API 密钥"""
+    """加载原始 API 密钥（文件未变化时直接返回缓存）"""
     try:
-        with open(APIKEY_PATH, "r", encoding="utf-8") as fh:
-            data = json.load(fh)
+        st = os.stat(APIKEY_PATH)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if _api_keys_cache["stamp"] == stamp:
+            return list(_api_keys_cache["keys"])
+        with open(APIKEY_PATH, "rb") as fh:
+            data = orjson.loads(fh.read())
         if isinstance(data, dict) and isinstance(data.get("keys"), list):
-            return [str(x) for x in data.get("keys")]
+            keys = [str(x) for x in data.get("keys")]
         elif isinstance(data, list):
-            return [str(x) for x in data]
+            keys = [str(x) for x in data]
         else:
-            return []
+            keys = []
+        _api_keys_cache["keys"] = keys
+        _api_keys_cache["stamp"] = stamp
+        return list(keys)
     except Exception:
         return []
 
@@ -82,18 +99,21 @@ async def _call_ai_with_retry(url: str, payload: dict, headers: dict, max_retrie
     - HTTPException: 请求失败
     """
     last_error = None
+    attempts = 0
     
     for attempt in range(1, max_retries + 1):
+        attempts = attempt
         try:
             logger.info(f"AI请求尝试 {attempt}/{max_retries}")
             
-            async with httpx.AsyncClient(timeout=AI_TIMEOUT) as client:
-                r = await client.post(url, json=payload, headers=headers)
-                r.raise_for_status()
-                result = r.json()
-                
-                logger.info(f"AI请求成功 (尝试 {attempt}/{max_retries})")
-                return result
+            # 复用全局 HTTP 客户端（保持长连接，省去每次 TCP+TLS 握手）
+            client = app_state.http_client
+            r = await client.post(url, json=payload, headers=headers, timeout=AI_TIMEOUT)
+            r.raise_for_status()
+            result = r.json()
+            
+            logger.info(f"AI请求成功 (尝试 {attempt}/{max_retries})")
+            return result
                 
         except httpx.TimeoutException as e:
             last_error = f"请求超时（{AI_TIMEOUT}秒）"
@@ -104,25 +124,31 @@ async def _call_ai_with_retry(url: str, payload: dict, headers: dict, max_retrie
             last_error = f"HTTP {status_code}"
             logger.warning(f"AI请求失败 HTTP {status_code} (尝试 {attempt}/{max_retries})")
             
-            # 4xx错误不重试（客户端错误）
-            if 400 <= status_code < 500:
+            # 4xx错误（客户端错误）和不支持类的5xx错误不重试
+            if 400 <= status_code < 500 or status_code in AI_NON_RETRYABLE_STATUS:
                 raise HTTPException(status_code=502, detail=f"AI API错误: HTTP {status_code}")
+        
+        except httpx.ConnectError as e:
+            # 连不上上游（DNS失败、拒绝连接等），短时间内重试也没有意义
+            last_error = f"无法连接AI服务: {e}"
+            logger.warning(f"AI请求连接失败 (尝试 {attempt}/{max_retries}): {e}")
+            break
                 
         except Exception as e:
             last_error = str(e)
             logger.warning(f"AI请求异常 (尝试 {attempt}/{max_retries}): {e}")
         
-        # 如果不是最后一次尝试，等待后重试
+        # 如果不是最后一次尝试，等待后重试（指数退避 + 随机抖动，避免大量请求同时重试）
         if attempt < max_retries:
-            wait_time = attempt * 1  # 递增等待：1秒、2秒、3秒
-            logger.info(f"等待 {wait_time}秒 后重试...")
+            wait_time = min(AI_RETRY_MAX_WAIT, 2 ** (attempt - 1) + random.random())
+            logger.info(f"等待 {wait_time:.1f}秒 后重试...")
             await asyncio.sleep(wait_time)
     
     # 所有重试都失败
-    logger.error(f"AI请求失败，已重试 {max_retries} 次: {last_error}")
+    logger.error(f"AI请求失败，已尝试 {attempts} 次: {last_error}")
     raise HTTPException(
         status_code=503, 
-        detail=f"AI服务繁忙，请稍后再试（已重试{max_retries}次）"
+        detail=f"AI服务繁忙，请稍后再试（已尝试{attempts}次）"
     )
 
 
@@ -188,10 +214,7 @@ async def api_ai_chat(payload: dict, request: Request):
         logger.info(f"AI聊天成功 - 回复长度: {len(cleaned)}")
         
         # 记录AI对话（为了用户隐私，不记录任何对话内容）
-        try:
-            await track_ip(request, "AI对话", {})
-        except Exception as e:
-            logger.warning(f"记录AI对话失败: {e}")
+        track_ip(request, "AI对话", {})
         
         return {
             "message": cleaned,
@@ -229,12 +252,9 @@ async def api_ai_chat_stream(payload: dict, request: Request):
     logger.info(f"AI流式聊天请求 - 模型: {model}, 内容长度: {len(content)}")
     
     # 记录AI对话（为了用户隐私，不记录任何对话内容）
-    try:
-        await track_ip(request, "AI对话", {})
-    except Exception as e:
-        logger.warning(f"记录AI对话失败: {e}")
+    track_ip(request, "AI对话", {})
     
-    async def generate_stream() -> AsyncGenerator[str, None]:
+    async def generate_stream() -> AsyncGenerator[bytes, None]:
         """生成流式响应"""
         url = "https://api.siliconflow.cn/v1/chat/completions"
         messages = []
@@ -253,62 +273,56 @@ async def api_ai_chat_stream(payload: dict, request: Request):
             "Content-Type": "application/json",
         }
         
-        total_chars = 0
+        total_events = 0
         try:
-            async with httpx.AsyncClient(timeout=90.0) as client:  # 流式响应超时90秒
-                async with client.stream("POST", url, json=request_payload, headers=headers) as response:
-                    response.raise_for_status()
-                    
-                    # 逐行读取SSE数据
-                    buffer = ""
-                    async for chunk in response.aiter_bytes():
-                        buffer += chunk.decode('utf-8')
+            client = app_state.http_client  # 复用全局 HTTP 客户端
+            async with client.stream("POST", url, json=request_payload, headers=headers,
+                                     timeout=AI_STREAM_TIMEOUT) as response:
+                response.raise_for_status()
+                
+                # 按字节逐行切分SSE数据，data 行原样转发给前端（前端自行解析 choices[0].delta.content），
+                # 不再逐条解析和重新序列化 JSON；字节缓冲也不会把跨块的多字节字符切坏
+                buffer = bytearray()
+                finished = False
+                async for chunk in response.aiter_bytes():
+                    buffer.extend(chunk)
+                    pos = 0
+                    while True:
+                        nl = buffer.find(b"\n", pos)
+                        if nl < 0:
+                            break
+                        line = bytes(buffer[pos:nl]).strip()
+                        pos = nl + 1
+                        
+                        # SSE格式：data: {...}，空行和注释行跳过
+                        if not line.startswith(b"data:"):
+                            continue
                         
-                        # 按行分割处理
-                        while '\n' in buffer:
-                            line, buffer = buffer.split('\n', 1)
-                            line = line.strip()
-                            
-                            if not line:
-                                continue
-                            
-                            # SSE格式：data: {...}
-                            if line.startswith("data: "):
-                                data_str = line[6:]  # 去掉 "data: " 前缀
-                                
-                                # 结束标志
-                                if data_str.strip() == "[DONE]":
-                                    break
-                                
-                                try:
-                                    data = json.loads(data_str)
-                                    delta = data.get("choices", [{}])[0].get("delta", {})
-                                    content_chunk = delta.get("content", "")
-                                    
-                                    if content_chunk:
-                                        total_chars += len(content_chunk)
-                                        # 返回每个字符块，前端会逐字显示
-                                        yield f"data: {json.dumps({'content': content_chunk}, ensure_ascii=False)}\n\n"
-                                except json.JSONDecodeError:
-                                    continue
-                    
-                    # 流结束标志
-                    logger.info(f"AI流式聊天成功 - 总字符数: {total_chars}")
-                    yield "data: [DONE]\n\n"
-                    
+                        # 结束标志
+                        if line[5:].strip() == b"[DONE]":
+                            finished = True
+                            break
+                        
+                        total_events += 1
+                        yield line + b"\n\n"
+                    del buffer[:pos]
+                    if finished:
+                        break
+                
+                # 流结束标志
+                logger.info(f"AI流式聊天成功 - 总事件数: {total_events}")
+                yield b"data: [DONE]\n\n"
+                
         except httpx.TimeoutException as e:
             logger.error(f"AI流式请求超时: {e}")
-            error_msg = json.dumps({"error": "AI服务繁忙，请稍后再试（请求超时）"}, ensure_ascii=False)
-            yield f"data: {error_msg}\n\n"
+            yield b"data: " + orjson.dumps({"error": "AI服务繁忙，请稍后再试（请求超时）"}) + b"\n\n"
         except httpx.HTTPStatusError as http_err:
             status_code = http_err.response.status_code
             logger.error(f"AI流式请求失败 HTTP {status_code}")
-            error_msg = json.dumps({"error": f"AI服务繁忙，请稍后再试（HTTP {status_code}）"}, ensure_ascii=False)
-            yield f"data: {error_msg}\n\n"
+            yield b"data: " + orjson.dumps({"error": f"AI服务繁忙，请稍后再试（HTTP {status_code}）"}) + b"\n\n"
         except Exception as exc:
             logger.error(f"AI流式请求异常: {exc}", exc_info=True)
-            error_msg = json.dumps({"error": "AI服务繁忙，请稍后再试"}, ensure_ascii=False)
-            yield f"data: {error_msg}\n\n"
+            yield b"data: " + orjson.dumps({"error": "AI服务繁忙，请稍后再试"}) + b"\n\n"
     
     return StreamingResponse(
         generate_stream(),
@@ -1,6 +1,5 @@
 import os
-import json
-import time
+import orjson
 import asyncio
 from datetime import datetime
 from typing import List, Dict, Any
@@ -17,20 +16,39 @@ router = APIRouter()
 logger = get_logger(__name__)
 
 
+# Excel 文件名缓存：以 BASE_DIR 的修改时间为键，目录内增删改名文件时自动失效
+_excel_names_cache: Dict[str, Any] = {"mtime_ns": None, "names": []}
+
+
+def _list_excel_names() -> List[str]:
+    """列出 BASE_DIR 下的 Excel 文件名（按目录修改时间缓存）"""
+    dir_mtime_ns = os.stat(BASE_DIR).st_mtime_ns
+    if _excel_names_cache["mtime_ns"] != dir_mtime_ns:
+        names = []
+        # scandir 的 is_file 直接使用目录项自带的类型信息，不用逐个 stat
+        with os.scandir(BASE_DIR) as it:
+            for entry in it:
+                if os.path.splitext(entry.name)[1].lower() in EXCEL_EXTENSIONS and entry.is_file():
+                    names.append(entry.name)
+        _excel_names_cache["names"] = names
+        _excel_names_cache["mtime_ns"] = dir_mtime_ns
+    return _excel_names_cache["names"]
+
+
 def list_excel_files() -> List[Dict[str, Any]]:
-    """列出 Excel 文件"""
+    """列出 Excel 文件（文件名走缓存，大小和修改时间每次实时读取）"""
     files: List[Dict[str, Any]] = []
-    for name in os.listdir(BASE_DIR):
+    for name in _list_excel_names():
         path = os.path.join(BASE_DIR, name)
-        if os.path.isfile(path):
-            _, ext = os.path.splitext(name)
-            if ext.lower() in EXCEL_EXTENSIONS:
-                stat = os.stat(path)
-                files.append({
-                    "name": name,
-                    "size": stat.st_size,
-                    "mtime": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
-                })
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append({
+            "name": name,
+            "size": stat.st_size,
+            "mtime": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
+        })
     files.sort(key=lambda x: x["name"].lower())
     return files
 
@@ -44,7 +62,7 @@ async def api_excel_files():
 @router.get("/api/excel/status")
 async def api_excel_status():
     """获取 Excel 加载状态"""
-    actual_ready = is_data_loaded()
+    actual_ready = await is_data_loaded()
     state = loading_state.snapshot()
     state.update({
         "loaded": bool(actual_ready),
@@ -55,46 +73,44 @@ async def api_excel_status():
 
 @router.get("/api/excel/stream")
 async def api_excel_stream(duration: float = 10.0, interval: float = 0.5):
-    """SSE 流式返回加载状态"""
+    """SSE 流式返回加载状态（状态变化时推送，两次推送至少间隔 interval 秒，空闲时只发心跳）"""
     max_seconds = max(1.0, min(duration, 60.0))
     interval = max(0.1, min(interval, 2.0))
+    heartbeat = max(2.0, interval * 3)
 
     async def generate():
-        last_sent: Dict[str, Any] = {}
-        last_emit_ts = 0.0
-        start_time = time.time()
-
-        while True:
-            snapshot = loading_state.snapshot()
-            state = {
-                "loaded": bool(is_data_loaded()),
-                **snapshot,
-            }
-
-            changed = False
-            if not last_sent:
-                changed = True
-            else:
-                if state.get("timestamp") != last_sent.get("timestamp"):
-                    changed = True
-                elif int(state.get("percent", -1)) != int(last_sent.get("percent", -1)):
-                    changed = True
-                elif state.get("running") != last_sent.get("running"):
-                    changed = True
-
-            now = time.time()
-            if changed or (now - last_emit_ts) >= max(2.0, interval * 3):
-                last_sent = state
-                last_emit_ts = now
-                yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
-
-            if now - start_time >= max_seconds:
-                break
-
-            await asyncio.sleep(interval)
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        loading_state.add_change_listener(loop, changed)
+        deadline = loop.time() + max_seconds
+        try:
+            # 先推送一次当前状态
+            changed.set()
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    if deadline - loop.time() > 0:
+                        # 没有变化：只发 SSE 注释保持连接，不读取状态
+                        yield b": heartbeat\n\n"
+                    continue
+
+                changed.clear()
+                state = {
+                    "loaded": bool(await is_data_loaded()),
+                    **loading_state.snapshot(),
+                }
+                yield b"data: " + orjson.dumps(state) + b"\n\n"
+                # 限制推送频率，期间的多次变化合并为下一次推送
+                await asyncio.sleep(min(interval, max(0.0, deadline - loop.time())))
+        finally:
+            loading_state.remove_change_listener(changed)
 
         closing_payload = {"event": "done", "timestamp": datetime.utcnow().isoformat()}
-        yield f"data: {json.dumps(closing_payload, ensure_ascii=False)}\n\n"
+        yield b"data: " + orjson.dumps(closing_payload) + b"\n\n"
 
     return StreamingResponse(generate(), media_type="text/event-stream")
 
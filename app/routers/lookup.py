@@ -12,49 +12,85 @@ from core.ip_tracker import track_ip
 router = APIRouter()
 logger = get_logger(__name__)
 
+# 查询词长度上限：词库里最长的词条也远短于此，超长输入直接拒绝，不做标准化也不查库
+MAX_WORD_LENGTH = 64
+
+
+# 查询语句（固定字符串，sqlite3 按 SQL 文本命中连接上的预编译语句缓存）
+_SQL_WORD = "SELECT word, phonetic, meaning FROM entries WHERE word_norm = ? LIMIT 1"
+_SQL_WORD_POSITIONS = "SELECT sheet, row_index FROM entries WHERE word_norm = ? LIMIT 1"
+_SQL_ROW = "SELECT word, phonetic, meaning FROM entries WHERE sheet = ? AND row_index = ?"
+_SQL_SUGGEST = (
+    "SELECT MIN(word) FROM entries WHERE word_norm GLOB ? "
+    "GROUP BY word_norm ORDER BY word_norm LIMIT ?"
+)
+
+# 连接池建连时预先执行一次（见 DatabasePool 的 warm_statements）
+LOOKUP_WARM_STATEMENTS = (
+    (_SQL_WORD, ("",)),
+    (_SQL_WORD_POSITIONS, ("",)),
+    (_SQL_ROW, ("", -1)),
+    (_SQL_SUGGEST, ("*", 1)),
+)
+
+
+# 以下查询函数在连接池的工作线程中执行（见 DatabasePool.run），不占用事件循环
+
+def _fetch_word(conn, norm: str):
+    """按规范化单词查询释义"""
+    return conn.execute(_SQL_WORD, (norm,)).fetchone()
+
+
+def _fetch_word_positions(conn, norm: str):
+    """按规范化单词查询所在位置"""
+    return conn.execute(_SQL_WORD_POSITIONS, (norm,)).fetchall()
+
+
+def _fetch_row(conn, sheet: str, row_index: int):
+    """按工作表和行号查询单词"""
+    return conn.execute(_SQL_ROW, (sheet, row_index)).fetchone()
+
+
+def _fetch_suggestions(conn, prefix_norm: str, limit: int):
+    """按规范化前缀查询候选单词（GLOB 固定前缀可走 word_norm 索引范围扫描）"""
+    return [r[0] for r in conn.execute(_SQL_SUGGEST, (prefix_norm + "*", limit))]
+
 
 @router.get("/api/lookup")
 async def api_lookup(word: str, request: Request):
     """查询单词释义（使用连接池）"""
-    if not is_data_loaded():
+    if not await is_data_loaded():
         logger.warning("查询失败：数据库未加载")
         raise HTTPException(status_code=400, detail="loading or db not ready")
     if not word:
         raise HTTPException(status_code=400, detail="missing word")
+    if len(word) > MAX_WORD_LENGTH:
+        raise HTTPException(status_code=400, detail="word too long")
     
     norm = normalize_word(word)
     logger.info(f"查询单词: {word} (规范化: {norm})")
     
     try:
-        # 使用连接池（自动获取和归还连接）
-        with app_state.db_pool.get_db() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT word, phonetic, meaning FROM entries WHERE word_norm = ? LIMIT 1",
-                (norm,),
-            )
-            result = cur.fetchone()
-            
-            if not result:
-                logger.info(f"单词未找到: {word}")
-                raise HTTPException(status_code=404, detail="not found")
-            
-            w, phonetic, meaning = result
-            row_obj = {
-                "1": w or "",
-                "2": phonetic or "",
-                "3": meaning or "",
-            }
-            logger.info(f"查询成功: {word}")
-            
-            # 记录查询单词
-            try:
-                await track_ip(request, "查询单词", {"word": word})
-            except Exception as e:
-                logger.warning(f"记录查询失败: {e}")
-            
-            return {"word": word, "row": row_obj}
-            
+        # 使用连接池（在线程中查询，自动获取和归还连接）
+        result = await app_state.db_pool.run(_fetch_word, norm)
+        
+        if not result:
+            logger.info(f"单词未找到: {word}")
+            raise HTTPException(status_code=404, detail="not found")
+        
+        w, phonetic, meaning = result
+        row_obj = {
+            "1": w or "",
+            "2": phonetic or "",
+            "3": meaning or "",
+        }
+        logger.info(f"查询成功: {word}")
+        
+        # 记录查询单词
+        track_ip(request, "查询单词", {"word": word})
+        
+        return {"word": word, "row": row_obj}
+        
     except HTTPException:
         raise
     except Exception as exc:
@@ -62,32 +98,50 @@ async def api_lookup(word: str, request: Request):
         raise HTTPException(status_code=500, detail=f"db error: {exc}")
 
 
+@router.get("/api/lookup/suggest")
+async def api_lookup_suggest(prefix: str, limit: int = 20):
+    """按前缀联想单词（输入时逐键调用，不记录访问日志）"""
+    if not await is_data_loaded():
+        raise HTTPException(status_code=400, detail="loading or db not ready")
+    if len(prefix) > MAX_WORD_LENGTH:
+        raise HTTPException(status_code=400, detail="word too long")
+    
+    # normalize_word 只保留字母、连字符、撇号和空格，GLOB 通配符不会出现在前缀里
+    norm = normalize_word(prefix)
+    if not norm:
+        return {"prefix": prefix, "normalized": norm, "count": 0, "words": []}
+    limit = max(1, min(limit, 50))
+    
+    try:
+        words = await app_state.db_pool.run(_fetch_suggestions, norm, limit)
+        return {"prefix": prefix, "normalized": norm, "count": len(words), "words": words}
+    except Exception as exc:
+        logger.error(f"联想查询异常 [{prefix}]: {exc}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"db error: {exc}")
+
+
 @router.get("/api/excel/search")
 async def api_excel_search(word: str):
     """搜索单词位置（使用连接池）"""
-    if not is_data_loaded():
+    if not await is_data_loaded():
         logger.warning("搜索失败：数据库未加载")
         raise HTTPException(status_code=400, detail="loading or db not ready")
     if not word:
         raise HTTPException(status_code=400, detail="missing word")
+    if len(word) > MAX_WORD_LENGTH:
+        raise HTTPException(status_code=400, detail="word too long")
     
     norm = normalize_word(word)
     logger.info(f"搜索单词位置: {word}")
     
     try:
-        with app_state.db_pool.get_db() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT sheet, row_index FROM entries WHERE word_norm = ? LIMIT 1",
-                (norm,),
-            )
-            rows = cur.fetchall()
-            matches: List[Dict[str, Any]] = []
-            for s, r in rows:
-                matches.append({"sheet": s, "row_index": int(r) if r is not None else 0})
-            
-            logger.info(f"搜索成功: {word}, 找到 {len(matches)} 个结果")
-            return {"word": word, "normalized": norm, "count": len(matches), "matches": matches}
+        rows = await app_state.db_pool.run(_fetch_word_positions, norm)
+        matches: List[Dict[str, Any]] = []
+        for s, r in rows:
+            matches.append({"sheet": s, "row_index": int(r) if r is not None else 0})
+        
+        logger.info(f"搜索成功: {word}, 找到 {len(matches)} 个结果")
+        return {"word": word, "normalized": norm, "count": len(matches), "matches": matches}
     except Exception as exc:
         logger.error(f"搜索异常 [{word}]: {exc}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"db error: {exc}")
@@ -96,7 +150,7 @@ async def api_excel_search(word: str):
 @router.get("/api/excel/row")
 async def api_excel_row(sheet: str, row_index: int):
     """根据位置查询单词（使用连接池）"""
-    if not is_data_loaded():
+    if not await is_data_loaded():
         logger.warning("位置查询失败：数据库未加载")
         raise HTTPException(status_code=400, detail="loading or db not ready")
     if not sheet or row_index < 0:
@@ -105,30 +159,24 @@ async def api_excel_row(sheet: str, row_index: int):
     logger.info(f"按位置查询: sheet={sheet}, row={row_index}")
     
     try:
-        with app_state.db_pool.get_db() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT word, phonetic, meaning FROM entries WHERE sheet = ? AND row_index = ?",
-                (sheet, row_index),
-            )
-            result = cur.fetchone()
-            
-            if not result:
-                logger.info(f"位置未找到: sheet={sheet}, row={row_index}")
-                raise HTTPException(status_code=404, detail="not found")
-            
-            word_text, phonetic, meaning = result
-            row_obj = {
-                "1": word_text or "",
-                "2": phonetic or "",
-                "3": meaning or "",
-            }
-            logger.info(f"位置查询成功: {word_text}")
-            return {
-                "sheet": sheet,
-                "row_index": row_index,
-                "row": row_obj,
-            }
+        result = await app_state.db_pool.run(_fetch_row, sheet, row_index)
+        
+        if not result:
+            logger.info(f"位置未找到: sheet={sheet}, row={row_index}")
+            raise HTTPException(status_code=404, detail="not found")
+        
+        word_text, phonetic, meaning = result
+        row_obj = {
+            "1": word_text or "",
+            "2": phonetic or "",
+            "3": meaning or "",
+        }
+        logger.info(f"位置查询成功: {word_text}")
+        return {
+            "sheet": sheet,
+            "row_index": row_index,
+            "row": row_obj,
+        }
     except HTTPException:
         raise
     except Exception as exc:
@@ -1,4 +1,6 @@
 import os
+import asyncio
+from typing import Dict, Tuple
 from fastapi import APIRouter, HTTPException, Request
 
 from core.config import DATA_SENTENCE_DIR, TXT_EXTENSIONS
@@ -9,6 +11,27 @@ from core.ip_tracker import track_ip
 router = APIRouter()
 logger = get_logger(__name__)
 
+# 情境句文件内容缓存：路径 -> (修改时间, 文件大小, 内容)，文件变化后自动重新读取
+_content_cache: Dict[str, Tuple[int, int, str]] = {}
+
+
+def _read_sentence_file(file_path: str) -> str:
+    """读取情境句文件（在线程中执行）；一次读入字节，UTF-8 失败再按 GB18030 解码"""
+    st = os.stat(file_path)
+    cached = _content_cache.get(file_path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    try:
+        content = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        content = raw.decode("gb18030", errors="ignore")
+    # 与文本模式读取一致：统一换行符
+    content = content.replace("\r\n", "\n").replace("\r", "\n")
+    _content_cache[file_path] = (st.st_mtime_ns, st.st_size, content)
+    return content
+
 
 @router.get("/api/txt/list")
 async def api_txt_list():
@@ -16,12 +39,10 @@ async def api_txt_list():
     files = []
     if not os.path.isdir(DATA_SENTENCE_DIR):
         return {"files": files}
-    for name in os.listdir(DATA_SENTENCE_DIR):
-        path = os.path.join(DATA_SENTENCE_DIR, name)
-        if os.path.isfile(path):
-            _, ext = os.path.splitext(name)
-            if ext.lower() in TXT_EXTENSIONS:
-                files.append(name)
+    with os.scandir(DATA_SENTENCE_DIR) as it:
+        for entry in it:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in TXT_EXTENSIONS:
+                files.append(entry.name)
     files.sort(key=natural_sort_key)
     return {"files": files}
 
@@ -39,26 +60,12 @@ async def api_txt_content(name: str, request: Request):
     file_path = os.path.join(base, safe_name)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="file not found")
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        # 记录打开句子
-        try:
-            await track_ip(request, "打开句子", {"filename": safe_name})
-        except Exception as e:
-            logger.warning(f"记录打开句子失败: {e}")
-        
-        return {"name": safe_name, "content": content}
-    except UnicodeDecodeError:
-        with open(file_path, "r", encoding="gb18030", errors="ignore") as f:
-            content = f.read()
-        
-        # 记录打开句子
-        try:
-            await track_ip(request, "打开句子", {"filename": safe_name})
-        except Exception as e:
-            logger.warning(f"记录打开句子失败: {e}")
-        
-        return {"name": safe_name, "content": content}
+    
+    # 文件读取放到线程中，不阻塞事件循环
+    content = await asyncio.to_thread(_read_sentence_file, file_path)
+    
+    # 记录打开句子
+    track_ip(request, "打开句子", {"filename": safe_name})
+    
+    return {"name": safe_name, "content": content}
 
@@ -1,12 +1,78 @@
 import os
+import shutil
+import subprocess
+import threading
 from typing import Optional
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
 
 from core.config import TODAY_PHRASE_DIR, IMAGE_EXTENSIONS
+from core.app_state import app_state
 
 router = APIRouter()
 
+# 图片文件名带日期，换图即换名：浏览器缓存一天且无需重新验证
+TODAYPHRASE_CACHE_CONTROL = "public, max-age=86400, immutable"
+
+# WEBP 编码参数：质量75；method=4 压缩率接近 6，编码快得多（启动时执行，会拖慢启动）
+WEBP_QUALITY = 75
+WEBP_METHOD = 4
+# cwebp 能直接读取的格式（GIF 需要 gif2webp，交给 Pillow）
+CWEBP_INPUT_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg"})
+CWEBP_TIMEOUT = 60
+
+# 并发请求同时缓存失效时，只让一个去扫描目录
+_todayphrase_lock = threading.Lock()
+
+
+class TodayPhraseStaticFiles(StaticFiles):
+    """今日一签图片目录（挂载在 /todayphrase）：只提供图片文件，附带缓存头"""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        # 不合法的请求不进入 StaticFiles 的路径查找
+        if not _is_image_file_name(path):
+            raise HTTPException(status_code=404, detail="file not found")
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope,
+                      status_code: int = 200) -> Response:
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers={"Cache-Control": TODAYPHRASE_CACHE_CONTROL},
+        )
+        # ETag / Last-Modified 由 FileResponse 按文件修改时间和大小生成，条件请求直接返回304
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def _encode_webp_with_cwebp(src_path: str, webp_path: str) -> bool:
+    """用 cwebp 命令行编码 WEBP（PATH 中没有 cwebp 或编码失败时返回 False）"""
+    cwebp = shutil.which("cwebp")
+    if not cwebp:
+        return False
+    try:
+        subprocess.run(
+            [cwebp, "-quiet", "-mt", "-q", str(WEBP_QUALITY), "-m", str(WEBP_METHOD), src_path, "-o", webp_path],
+            check=True,
+            capture_output=True,
+            timeout=CWEBP_TIMEOUT,
+        )
+        return os.path.getsize(webp_path) > 0
+    except Exception:
+        try:
+            os.remove(webp_path)
+        except Exception:
+            pass
+        return False
+
 
 def _maybe_generate_webp_for(src_path: str) -> Optional[str]:
     """尝试生成 WEBP 并返回文件名"""
@@ -29,6 +95,14 @@ def _maybe_generate_webp_for(src_path: str) -> Optional[str]:
             except Exception:
                 return os.path.basename(webp_path)
 
+        # 优先用 libwebp 自带的 cwebp（-mt 多线程编码），没有安装或失败时再用 Pillow
+        if src_ext_lower in CWEBP_INPUT_EXTENSIONS and _encode_webp_with_cwebp(src_path, webp_path):
+            try:
+                os.remove(src_path)
+            except Exception:
+                pass
+            return os.path.basename(webp_path)
+
         try:
             from PIL import Image
         except Exception:
@@ -36,7 +110,7 @@ def _maybe_generate_webp_for(src_path: str) -> Optional[str]:
 
         try:
             with Image.open(src_path) as im:
-                im.save(webp_path, format="WEBP", quality=75, method=6)
+                im.save(webp_path, format="WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
             try:
                 os.remove(src_path)
             except Exception:
@@ -48,40 +122,58 @@ def _maybe_generate_webp_for(src_path: str) -> Optional[str]:
         return None
 
 
+def _ext_lower(name: str) -> str:
+    """取小写扩展名（含点）；文件名不含路径，用 rfind 代替 os.path.splitext，以点开头的文件视为无扩展名"""
+    dot = name.rfind(".")
+    return name[dot:].lower() if dot > 0 else ""
+
+
+def _is_image_file_name(name: str) -> bool:
+    """
+    是否是目录下的单层图片文件名：不含路径分隔符、扩展名是图片（以点开头的文件视为无扩展名）
+
+    与 _find_todayphrase_file / preprocess_todayphrase_startup 挑选图片的条件一致，
+    接口返回的文件名（含空格、多个点的也一样）都能通过；解析后的路径是否仍在目录内由 StaticFiles 再检查
+    """
+    return "/" not in name and "\\" not in name and _ext_lower(name) in IMAGE_EXTENSIONS
+
+
 def _find_todayphrase_file() -> Optional[str]:
-    """查找今日一签图片文件"""
+    """查找今日一签图片文件（只读：WEBP 转换在启动预处理中完成，这里优先返回 WEBP）"""
     try:
         if not os.path.isdir(TODAY_PHRASE_DIR):
             return None
-        for name in os.listdir(TODAY_PHRASE_DIR):
-            path = os.path.join(TODAY_PHRASE_DIR, name)
-            if not os.path.isfile(path):
-                continue
-            _, ext = os.path.splitext(name)
-            if ext.lower() in IMAGE_EXTENSIONS:
-                preferred = _maybe_generate_webp_for(path)
-                return preferred or name
+        fallback: Optional[str] = None
+        # scandir 的 is_file 直接使用目录项自带的类型信息，不用逐个 stat
+        with os.scandir(TODAY_PHRASE_DIR) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                ext_lower = _ext_lower(entry.name)
+                if ext_lower == ".webp":
+                    return entry.name
+                if ext_lower in IMAGE_EXTENSIONS and fallback is None:
+                    fallback = entry.name
+        return fallback
     except Exception:
         return None
-    return None
 
 
-def preprocess_todayphrase_startup() -> None:
-    """启动时预处理：转换为 WEBP 并保留单个文件"""
+def preprocess_todayphrase_startup() -> Optional[str]:
+    """启动时预处理：转换为 WEBP 并保留单个文件，返回保留的文件名（没有则返回 None）"""
     try:
         if not os.path.isdir(TODAY_PHRASE_DIR):
-            return
+            return None
         candidate_path: Optional[str] = None
-        for name in os.listdir(TODAY_PHRASE_DIR):
-            full = os.path.join(TODAY_PHRASE_DIR, name)
-            if not os.path.isfile(full):
-                continue
-            _, ext = os.path.splitext(name)
-            if ext.lower() in IMAGE_EXTENSIONS:
-                candidate_path = full
-                break
+        with os.scandir(TODAY_PHRASE_DIR) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                if _ext_lower(entry.name) in IMAGE_EXTENSIONS:
+                    candidate_path = entry.path
+                    break
         if not candidate_path:
-            return
+            return None
             
         _maybe_generate_webp_for(candidate_path)
         
@@ -91,45 +183,47 @@ def preprocess_todayphrase_startup() -> None:
         except Exception:
             pass
             
-        kept = False
-        for name in sorted(os.listdir(TODAY_PHRASE_DIR)):
-            full = os.path.join(TODAY_PHRASE_DIR, name)
-            if not os.path.isfile(full):
-                continue
-            _, ext = os.path.splitext(name)
-            if ext.lower() in IMAGE_EXTENSIONS:
-                if not kept and ext.lower() == ".webp" and os.path.getsize(full) > 0:
-                    kept = True
+        kept: Optional[str] = None
+        with os.scandir(TODAY_PHRASE_DIR) as it:
+            entries = sorted((e for e in it if e.is_file()), key=lambda e: e.name)
+        for entry in entries:
+            ext_lower = _ext_lower(entry.name)
+            if ext_lower in IMAGE_EXTENSIONS:
+                if not kept and ext_lower == ".webp" and entry.stat().st_size > 0:
+                    kept = entry.name
                     continue
                 try:
-                    os.remove(full)
+                    os.remove(entry.path)
                 except Exception:
                     pass
+        return kept
     except Exception:
-        pass
+        return None
+
+
+def _cached_todayphrase_file() -> Optional[str]:
+    """查找今日一签图片文件（按目录修改时间缓存，目录内文件增删改名后才重新扫描）"""
+    try:
+        dir_mtime_ns = os.stat(TODAY_PHRASE_DIR).st_mtime_ns
+    except OSError:
+        return None
+    cache = app_state.todayphrase_cache
+    if cache["dir_mtime_ns"] == dir_mtime_ns:
+        return cache["name"]
+    with _todayphrase_lock:
+        if cache["dir_mtime_ns"] != dir_mtime_ns:
+            cache["name"] = _find_todayphrase_file()
+            cache["dir_mtime_ns"] = dir_mtime_ns
+        return cache["name"]
 
 
 @router.get("/api/todayphrase")
 async def api_todayphrase():
-    """返回今日一签图片信息"""
-    name = _find_todayphrase_file()
+    """返回今日一签图片信息（启动预处理已确定文件名，直接返回；预处理未得到文件名时才扫描目录）"""
+    name = app_state.todayphrase_name or _cached_todayphrase_file()
     if not name:
         raise HTTPException(status_code=404, detail="not found")
     return {
         "name": name,
         "url": f"/todayphrase/{name}",
     }
-
-
-@router.get("/todayphrase/{filename}")
-async def todayphrase_raw(filename: str):
-    """提供今日一签图片文件"""
-    safe_name = os.path.basename(filename)
-    _, ext = os.path.splitext(safe_name)
-    if ext.lower() not in IMAGE_EXTENSIONS:
-        raise HTTPException(status_code=400, detail="invalid file type")
-    directory = TODAY_PHRASE_DIR
-    if not os.path.isdir(directory) or not os.path.exists(os.path.join(directory, safe_name)):
-        raise HTTPException(status_code=404, detail="file not found")
-    return FileResponse(os.path.join(directory, safe_name))
-
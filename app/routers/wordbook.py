@@ -11,34 +11,52 @@ router = APIRouter()
 logger = get_logger(__name__)
 
 
+def _count_entries(conn) -> int:
+    """统计单词总数（在连接池的工作线程中执行；id 连续编号，MAX(id) 即总数，也正是批次的上界）"""
+    (max_id,) = conn.execute("SELECT MAX(id) FROM entries").fetchone()
+    return max_id or 0
+
+
+def _fetch_range(conn, start: int, end: int) -> List[Dict[str, Any]]:
+    """按 id 范围查询单词（在连接池的工作线程中执行）"""
+    cur = conn.execute(
+        "SELECT id, word, phonetic, meaning FROM entries WHERE id BETWEEN ? AND ? ORDER BY id ASC",
+        (start, end),
+    )
+    # 直接迭代游标，不经过 fetchall 的中间列表
+    # id 是 INTEGER PRIMARY KEY，SQLite 直接返回 int，不需要再转换；响应由 orjson 序列化（默认响应类）
+    return [
+        {"id": rid, "word": w or "", "phonetic": phon or "", "meaning": mean or ""}
+        for rid, w, phon, mean in cur
+    ]
+
+
 @router.get("/api/wordbook/batches")
 async def api_wordbook_batches():
     """获取单词库批次列表（使用连接池）"""
-    if not is_data_loaded():
+    if not await is_data_loaded():
         logger.warning("批次列表获取失败：数据库未加载")
         raise HTTPException(status_code=400, detail="loading or db not ready")
     
     logger.info("获取单词库批次列表")
     
     try:
-        with app_state.db_pool.get_db() as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT COUNT(*) FROM entries")
-            (total_count,) = cur.fetchone() or (0,)
-            
-            total_count = int(total_count or 0)
-            batch_size = 100
-            batches = []
-            if total_count > 0:
-                start = 1
-                while start <= total_count:
-                    end = min(start + batch_size - 1, total_count)
-                    label = f"V{start}-{end}"
-                    batches.append({"label": label, "start": start, "end": end})
-                    start = end + 1
-            
-            logger.info(f"批次列表生成成功: 总计 {total_count} 个单词, {len(batches)} 个批次")
-            return {"total": total_count, "batch_size": batch_size, "batches": batches}
+        # 单词总数在加载完成时已统计，只有缺失时才查询一次并缓存
+        total_count = app_state.word_count
+        if total_count is None:
+            total_count = await app_state.db_pool.run(_count_entries)
+            app_state.word_count = total_count
+        
+        # 批次划分完全由总数决定，不需要查库
+        batch_size = 100
+        batches = [
+            {"label": f"V{start}-{min(start + batch_size - 1, total_count)}",
+             "start": start, "end": min(start + batch_size - 1, total_count)}
+            for start in range(1, total_count + 1, batch_size)
+        ]
+        
+        logger.info(f"批次列表生成成功: 总计 {total_count} 个单词, {len(batches)} 个批次")
+        return {"total": total_count, "batch_size": batch_size, "batches": batches}
     except Exception as exc:
         logger.error(f"批次列表获取异常: {exc}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"db error: {exc}")
@@ -47,7 +65,7 @@ async def api_wordbook_batches():
 @router.get("/api/wordbook/range")
 async def api_wordbook_range(start: int = 1, end: int = 0):
     """获取单词库指定范围（使用连接池）"""
-    if not is_data_loaded():
+    if not await is_data_loaded():
         logger.warning("范围查询失败：数据库未加载")
         raise HTTPException(status_code=400, detail="loading or db not ready")
     if start <= 0 or end < start or (end - start) > 1000:
@@ -56,25 +74,11 @@ async def api_wordbook_range(start: int = 1, end: int = 0):
     logger.info(f"获取单词范围: {start}-{end}")
     
     try:
-        with app_state.db_pool.get_db() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT id, word, phonetic, meaning FROM entries WHERE id BETWEEN ? AND ? ORDER BY id ASC",
-                (start, end),
-            )
-            rows = cur.fetchall()
-            
-            items = []
-            for rid, w, phon, mean in rows:
-                items.append({
-                    "id": int(rid or 0),
-                    "word": w or "",
-                    "phonetic": phon or "",
-                    "meaning": mean or "",
-                })
-            
-            logger.info(f"范围查询成功: 返回 {len(items)} 个单词")
-            return {"start": start, "end": end, "count": len(items), "items": items}
+        # 使用连接池（在线程中查询，自动获取和归还连接）
+        items = await app_state.db_pool.run(_fetch_range, start, end)
+        
+        logger.info(f"范围查询成功: 返回 {len(items)} 个单词")
+        return {"start": start, "end": end, "count": len(items), "items": items}
     except Exception as exc:
         logger.error(f"范围查询异常 [{start}-{end}]: {exc}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"db error: {exc}")
@@ -115,17 +115,20 @@ async function sendMessageStream(content, apiKey, keyIndex, model, system) {
       pendingBubble.classList.remove('pending');
     }
     
+    let buffer = '';
+    
     while (true) {
       const { done, value } = await reader.read();
       if (done) break;
       
-      // 解码数据块
-      const chunk = decoder.decode(value, { stream: true });
-      const lines = chunk.split('\n');
+      // 解码数据块，最后一行可能不完整，留到下一块再处理
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
       
       for (const line of lines) {
-        if (line.startsWith('data: ')) {
-          const data = line.slice(6);
+        if (line.startsWith('data:')) {
+          const data = line.slice(5).trim();
           
           if (data === '[DONE]') {
             break;
@@ -139,8 +142,10 @@ async function sendMessageStream(content, apiKey, keyIndex, model, system) {
               return;
             }
             
-            if (parsed.content) {
-              fullText += parsed.content;
+            // 后端原样转发上游事件，增量文本在 choices[0].delta.content
+            const piece = parsed.choices?.[0]?.delta?.content;
+            if (piece) {
+              fullText += piece;
               // 逐字更新气泡内容
               if (pendingBubble) {
                 pendingBubble.textContent = fullText;
@@ -0,0 +1,80 @@
+"""calamine 与 openpyxl 两种读取方式解析同一个工作簿，入库结果必须一致"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, time
+
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import database  # noqa: E402
+
+BUNDLED_XLSX = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.xlsx")
+
+
+def _build_workbook(path: str) -> None:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Unit1"
+    ws.append([1, "apple", "", "n. 苹果"])  # 音标为空字符串
+    ws.append([2, "banana", "/bəˈnɑːnə/", None])  # 释义为空
+    ws.append([3, 42, 7, 1.5])  # 数字单元格
+    ws.append([4, "  Tom's  ", True, -3])
+    ws.append([5, "date", datetime(2024, 1, 2), datetime(2024, 1, 2, 3, 4, 5)])
+    ws.append([6, "time", time(3, 4), 0])
+    ws.append([])
+    ws["F9"] = "x"  # 右下角孤立单元格，撑开行列范围
+
+    narrow = wb.create_sheet("Unit2")  # 不足四列，走逐行检查的分支
+    narrow.append([1, "cat"])
+    narrow.append([2, 100.0])
+    narrow.append([3])
+    wb.save(path)
+
+
+@unittest.skipIf(database.CalamineWorkbook is None, "python-calamine 未安装")
+class ExcelReaderParityTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        _build_workbook(self.path)
+        self.calamine = database.CalamineWorkbook
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _parse_all(self, path=None):
+        wb, sheets = database._open_workbook(path or self.path)
+        return {sheet: database._parse_sheet(wb, sheet) for sheet in sheets}
+
+    def _parse_with_both(self, path=None):
+        with_calamine = self._parse_all(path)
+        database.CalamineWorkbook = None
+        try:
+            with_openpyxl = self._parse_all(path)
+        finally:
+            database.CalamineWorkbook = self.calamine
+        return with_calamine, with_openpyxl
+
+    def test_same_entries(self):
+        with_calamine, with_openpyxl = self._parse_with_both()
+        self.assertEqual(list(with_calamine), ["Unit1", "Unit2"])
+        self.assertEqual(with_calamine, with_openpyxl)
+
+    @unittest.skipUnless(os.path.exists(BUNDLED_XLSX), "data.xlsx 不存在")
+    def test_bundled_workbook(self):
+        # 自带词库里有写成空字符串的音标/释义单元格，openpyxl 读成 ""，calamine 读不出区别
+        with_calamine, with_openpyxl = self._parse_with_both(BUNDLED_XLSX)
+        self.assertEqual(with_calamine, with_openpyxl)
+
+    def test_cell_values(self):
+        entries = self._parse_all()["Unit1"]
+        self.assertEqual(entries[0][2:4], (None, "n. 苹果"))
+        self.assertEqual(entries[1][3], None)
+        self.assertEqual(entries[2][1:4], ("42", "7", "1.5"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,7 +11,15 @@ Git提交前清理脚本
 import os
 import shutil
 import stat
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 并行删除的线程数（删除主要在等磁盘IO，Windows 上逐个文件删除尤其慢）
+DELETE_WORKERS = 8
+
+# 要清理的文件夹名称（集合：遍历时 O(1) 判断）
+CLEAN_FOLDER_NAMES = frozenset({"__pycache__", "logs", "sqlite"})
 
 
 def force_remove_readonly(func, path, exc_info):
@@ -27,52 +35,108 @@ def force_remove_readonly(func, path, exc_info):
         raise
 
 
+def _find_targets(root_dir, folder_names):
+    """
+    用 os.scandir 遍历目录，逐个返回名称匹配的文件夹路径
+    
+    - 目录项自带类型信息，is_dir 不需要再 stat
+    - 匹配的文件夹整个删除，不再进入其中查找
+    - 跳过 .git 目录
+    """
+    stack = [root_dir]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    if entry.name in folder_names:
+                        yield entry.path
+                    elif entry.name != ".git":
+                        stack.append(entry.path)
+        except OSError as e:
+            print(f"⚠ 无法读取文件夹: {current}（{e}）")
+
+
+def _rmtree_pycache(path):
+    """
+    删除 __pycache__ 文件夹：里面只有 .pyc 文件，逐个删除后删除文件夹本身，
+    比 shutil.rmtree 少了逐项判断和回调；万一有子文件夹则交给 shutil.rmtree
+    """
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, onerror=force_remove_readonly)
+                continue
+            try:
+                os.remove(entry.path)
+            except PermissionError:
+                # 只读文件：修改权限后重试
+                os.chmod(entry.path, stat.S_IWUSR | stat.S_IRUSR)
+                os.remove(entry.path)
+    os.rmdir(path)
+
+
+def _delete_folder(folder_path, retry):
+    """
+    删除单个文件夹，文件被占用时等待后重试
+    
+    返回：
+        是否删除成功
+    """
+    for attempt in range(retry):
+        try:
+            if os.path.basename(folder_path) == "__pycache__":
+                _rmtree_pycache(folder_path)
+            else:
+                # 使用 onerror 参数处理只读文件
+                shutil.rmtree(folder_path, onerror=force_remove_readonly)
+            return True
+        except PermissionError:
+            if attempt < retry - 1:
+                print(f"⚠ 文件被占用，等待1秒后重试... (尝试 {attempt + 1}/{retry})")
+                print(f"  文件夹: {folder_path}")
+                time.sleep(1)
+            else:
+                print(f"✗ 删除失败: {folder_path}")
+                print(f"  错误: 文件可能被其他程序占用")
+                print(f"  建议: 关闭占用该文件的程序后重试")
+        except Exception as e:
+            print(f"✗ 删除失败: {folder_path}")
+            print(f"  错误: {e}")
+            break
+    return False
+
+
 def delete_all_folders_by_name(root_dir, folder_names, retry=3):
     """
     递归删除所有指定名称的文件夹
     
     参数：
         root_dir: 根目录
-        folder_names: 要删除的文件夹名称列表
+        folder_names: 要删除的文件夹名称集合
         retry: 重试次数（默认3次）
     
     返回：
         deleted_paths: 已删除的文件夹路径列表
     """
     deleted_paths = []
-    folders_to_delete = []
     
-    # 第一步：遍历查找所有匹配的文件夹
-    for dirpath, dirnames, filenames in os.walk(root_dir, topdown=False):
-        for dirname in dirnames:
-            if dirname in folder_names:
-                folder_path = os.path.join(dirpath, dirname)
-                folders_to_delete.append(folder_path)
+    # 第一步：查找所有匹配的文件夹
+    folders_to_delete = list(_find_targets(root_dir, folder_names))
     
-    # 第二步：删除找到的文件夹
-    for folder_path in folders_to_delete:
-        deleted = False
-        for attempt in range(retry):
-            try:
-                # 使用 onerror 参数处理只读文件
-                shutil.rmtree(folder_path, onerror=force_remove_readonly)
+    # 第二步：并行删除找到的文件夹
+    with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+        results = executor.map(lambda path: _delete_folder(path, retry), folders_to_delete)
+        for folder_path, deleted in zip(folders_to_delete, results):
+            if deleted:
                 deleted_paths.append(folder_path)
-                print(f"✓ 已删除: {folder_path}")
-                deleted = True
-                break
-            except PermissionError:
-                if attempt < retry - 1:
-                    print(f"⚠ 文件被占用，等待1秒后重试... (尝试 {attempt + 1}/{retry})")
-                    print(f"  文件夹: {folder_path}")
-                    time.sleep(1)
-                else:
-                    print(f"✗ 删除失败: {folder_path}")
-                    print(f"  错误: 文件可能被其他程序占用")
-                    print(f"  建议: 关闭占用该文件的程序后重试")
-            except Exception as e:
-                print(f"✗ 删除失败: {folder_path}")
-                print(f"  错误: {e}")
-                break
+    
+    # 成功信息最后一次性输出（控制台逐行 print 很慢），出错信息在删除时立即输出
+    if deleted_paths:
+        sys.stdout.write("".join(f"✓ 已删除: {path}\n" for path in deleted_paths))
+        sys.stdout.flush()
     
     return deleted_paths
 
@@ -85,40 +149,30 @@ def clean_all():
     print(f"扫描目录: {os.path.abspath('.')}")
     print()
     
-    total_deleted = 0
-    
-    # 1. 清理 __pycache__
+    # 一次遍历同时查找三类文件夹，删除后再按类别汇总
     print("="*70)
-    print("【1/3】清理 __pycache__ 文件夹（Python字节码缓存）")
+    print("删除 __pycache__ / logs / sqlite 文件夹")
     print("="*70)
-    pycache_paths = delete_all_folders_by_name(".", ["__pycache__"])
-    if pycache_paths:
-        print(f"\n✓ 共删除 {len(pycache_paths)} 个 __pycache__ 文件夹")
-        total_deleted += len(pycache_paths)
-    else:
-        print("\n- 未找到任何 __pycache__ 文件夹")
+    deleted_paths = delete_all_folders_by_name(".", CLEAN_FOLDER_NAMES)
+    by_name = {name: [] for name in CLEAN_FOLDER_NAMES}
+    for path in deleted_paths:
+        by_name[os.path.basename(path)].append(path)
+    total_deleted = len(deleted_paths)
     
-    # 2. 清理 logs 文件夹
-    print("\n" + "="*70)
-    print("【2/3】清理 logs 文件夹（日志文件）")
-    print("="*70)
-    logs_paths = delete_all_folders_by_name(".", ["logs"])
-    if logs_paths:
-        print(f"\n✓ 共删除 {len(logs_paths)} 个 logs 文件夹")
-        total_deleted += len(logs_paths)
-    else:
-        print("\n- 未找到任何 logs 文件夹")
-    
-    # 3. 清理 sqlite 文件夹
-    print("\n" + "="*70)
-    print("【3/3】清理 sqlite 文件夹（数据库文件）")
-    print("="*70)
-    sqlite_paths = delete_all_folders_by_name(".", ["sqlite"])
-    if sqlite_paths:
-        print(f"\n✓ 共删除 {len(sqlite_paths)} 个 sqlite 文件夹")
-        total_deleted += len(sqlite_paths)
-    else:
-        print("\n- 未找到任何 sqlite 文件夹")
+    categories = [
+        ("__pycache__", "Python字节码缓存"),
+        ("logs", "日志文件"),
+        ("sqlite", "数据库文件"),
+    ]
+    for index, (name, description) in enumerate(categories, 1):
+        print("\n" + "="*70)
+        print(f"【{index}/{len(categories)}】{name} 文件夹（{description}）")
+        print("="*70)
+        paths = by_name[name]
+        if paths:
+            print(f"✓ 共删除 {len(paths)} 个 {name} 文件夹")
+        else:
+            print(f"- 未找到任何 {name} 文件夹")
     
     # 总结
     print("\n" + "="*70)